@@ -1,5 +1,13 @@
+import os
+import json
+import atexit
+import hashlib
+import threading
+import numpy as np
 from openai import OpenAI
-from settings.nolo_config import NoloCFG
+from settings.nolo_config import get_config
+from utils.img_hash import hamming_distances
+from utils.lru_cache import NoloLRUCache
 import logging
 
 
@@ -9,7 +17,7 @@ logger = logging.getLogger(__name__)
 
 # UTILS Class
 # Utils Import
-config = NoloCFG()
+config = get_config()
 
 
 BASE_PROMPT_ES = f"""Puedes describir esta imagen para un niño con discapacidad visual de 5 a 10 años de edad, 
@@ -23,6 +31,110 @@ and do it in less than {config.openai_min_lines} lines and {config.openai_max_ch
 
 GPT_MODEL = config.openai_model
 
+# Any change on the prompts or the model invalidates the cached descriptions
+PROMPT_VERSION = hashlib.sha1(
+    f"{GPT_MODEL}|{BASE_PROMPT_ES}|{BASE_PROMT_EN}".encode("utf-8")
+).hexdigest()[:8]
+
+# Description Cache Settings
+AI_CACHE_PATH = os.getenv("AI_CACHE_PATH", "./data/ai_desc_cache.json")
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "2000"))
+AI_CACHE_MAX_DISTANCE = int(os.getenv("AI_CACHE_MAX_DISTANCE", "4"))
+AI_CACHE_SAVE_EVERY = int(os.getenv("AI_CACHE_SAVE_EVERY", "20"))
+
+
+class NoloAIDescriptionCache:
+    """
+    Image Descriptions keyed by (perceptual hash, language, prompt version).
+    Pages within max_distance bits of a cached hash reuse its description.
+    The file is rewritten every save_every new descriptions, at the end of
+    each job through flush and at exit
+    """
+
+    def __init__(self, path=None, max_entries=None, max_distance=None, save_every=None):
+        self.path = AI_CACHE_PATH if path is None else path
+        self.max_distance = (
+            AI_CACHE_MAX_DISTANCE if max_distance is None else max_distance
+        )
+        self.save_every = AI_CACHE_SAVE_EVERY if save_every is None else save_every
+        self.index = NoloLRUCache(max_entries or AI_CACHE_MAX_ENTRIES)
+        self.file_lock = threading.Lock()
+        self.unsaved = 0
+        self.load()
+        atexit.register(self.flush)
+
+    def get(self, img_hash: int, lang: str) -> str | None:
+        description = self.index.get((img_hash, lang, PROMPT_VERSION))
+        if description is not None or self.max_distance == 0:
+            return description
+
+        # Near duplicates: vectorised distance over the same lang/prompt
+        candidates = [
+            (key, value)
+            for key, value in self.index.items()
+            if key[1] == lang and key[2] == PROMPT_VERSION
+        ]
+        if not candidates:
+            return None
+        hashes = np.array([key[0] for key, _ in candidates], dtype=np.uint64)
+        distances = hamming_distances(hashes, img_hash)
+        nearest = int(np.argmin(distances))
+        if distances[nearest] > self.max_distance:
+            return None
+
+        key, description = candidates[nearest]
+        self.index.get(key)  # refresh LRU position
+        return description
+
+    def put(self, img_hash: int, lang: str, description: str):
+        self.index.put((img_hash, lang, PROMPT_VERSION), description)
+        with self.file_lock:
+            self.unsaved += 1
+            due = self.unsaved >= self.save_every
+        if due:
+            self.save()
+
+    def flush(self):
+        """
+        Save the descriptions added since the last save, if any
+        """
+        if self.unsaved:
+            self.save()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for img_hash, lang, version, description in json.load(f):
+                    if version == PROMPT_VERSION:
+                        self.index.put((int(img_hash, 16), lang, version), description)
+            logger.info(f"{len(self.index)} AI Descriptions loaded from cache")
+        except Exception as e:
+            logger.warning(f"AI Description cache not loaded. REASON: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            with self.file_lock:
+                # Snapshot under the lock, the last write holds the newest entries
+                entries = [
+                    [f"{key[0]:016x}", key[1], key[2], value]
+                    for key, value in self.index.items()
+                ]
+                self.unsaved = 0
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(entries, f)
+                os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"AI Description cache not saved. REASON: {e}")
+
+    def stats(self) -> dict:
+        return self.index.stats()
+
 
 class NoloAIHelper:
     """
@@ -41,10 +153,13 @@ class NoloAIHelper:
             "es": {"user": BASE_PROMPT_ES.strip()},
             "en": {"user": BASE_PROMT_EN.strip()},
         }
+        self.cache = NoloAIDescriptionCache()
 
         logger.info("New Instance of AI Helper has been created")
 
-    def nolo_ai_description(self, img_url: str, lang: str = "es") -> str | None:
+    def nolo_ai_description(
+        self, img_url: str, lang: str = "es", img_hash: int | None = None
+    ) -> str | None:
         try:
             # Check if languages exist in the dictionary
             if lang not in list(self.prompts.keys()):
@@ -52,6 +167,14 @@ class NoloAIHelper:
                     f"AI Services stopped because {lang} is not defined as valid!"
                 )
                 return None
+
+            # Reuse the description of an identical or near identical page
+            if img_hash is not None:
+                img_ai_description = self.cache.get(img_hash, lang)
+                if img_ai_description is not None:
+                    logger.info("Image Description found in cache")
+                    return img_ai_description
+
             # Clear the response string
             img_ai_description = ""
             # Create a Description from the URL and the PROMPT condition
@@ -70,6 +193,8 @@ class NoloAIHelper:
             )
 
             img_ai_description = response.choices[0].message.content
+            if img_hash is not None and img_ai_description:
+                self.cache.put(img_hash, lang, img_ai_description)
 
             return img_ai_description
 
@@ -0,0 +1,170 @@
+import os
+import threading
+import boto3
+from botocore.client import Config
+from settings.nolo_config import get_config
+import logging
+
+
+# Create Logger
+logger = logging.getLogger(__name__)
+
+# Load Config
+cfg = get_config()
+
+# Global AWS IDs
+AWS_ACCESS_KEY_ID = cfg.aws_access_key_id
+AWS_SECRET_ACCESS_KEY = cfg.aws_secret_access_key_id
+REGION_NAME = cfg.aws_default_region
+
+# Connection Settings, shared by every client of the process
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+AWS_CONNECT_TIMEOUT_IN_SECS = float(os.getenv("AWS_CONNECT_TIMEOUT_IN_SECS", "5"))
+AWS_READ_TIMEOUT_IN_SECS = float(os.getenv("AWS_READ_TIMEOUT_IN_SECS", "60"))
+AWS_TCP_KEEPALIVE = os.getenv("AWS_TCP_KEEPALIVE", "true").lower() == "true"
+AWS_RETRY_MODE = os.getenv("AWS_RETRY_MODE", "standard")
+AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "3"))
+
+# Per service overrides of the shared Config
+SERVICE_CONFIG = {
+    "s3": {
+        "signature_version": "s3v4",
+        "s3": {"addressing_style": "path"},
+        "max_pool_connections": int(
+            os.getenv("S3_MAX_POOL_CONNECTIONS", str(AWS_MAX_POOL_CONNECTIONS))
+        ),
+    },
+}
+
+
+class NoloPoolStats:
+    """
+    In flight HTTP sends of one client, hooked on its botocore events.
+    A send that starts with every pooled connection busy opens an extra
+    connection that urllib3 discards afterwards, those are counted as
+    saturated
+    """
+
+    def __init__(self, service: str, pool_size: int):
+        self.service = service
+        self.pool_size = pool_size
+        self.lock = threading.Lock()
+        self.sends = 0
+        self.retries = 0
+        self.saturated = 0
+        self.inflight = 0
+        self.max_inflight = 0
+
+    def register(self, client):
+        events = client.meta.events
+        events.register("before-send", self.on_send)
+        events.register("needs-retry", self.on_done)
+
+    def on_send(self, **kwargs):
+        with self.lock:
+            self.sends += 1
+            if self.inflight >= self.pool_size:
+                self.saturated += 1
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+
+    def on_done(self, attempts=1, **kwargs):
+        # Emitted once per attempt, whatever its outcome
+        with self.lock:
+            self.inflight = max(self.inflight - 1, 0)
+            if attempts > 1:
+                self.retries += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "pool_size": self.pool_size,
+                "sends": self.sends,
+                "retries": self.retries,
+                "saturated": self.saturated,
+                "inflight": self.inflight,
+                "max_inflight": self.max_inflight,
+            }
+
+
+class NoloAWSClients:
+    """
+    Process wide registry of AWS clients. boto3 clients are thread safe,
+    so every handler shares one client per service and its connection pool
+    """
+
+    def __init__(self):
+        # Sessions are not thread safe, clients are created under the lock
+        self.session = None
+        self.lock = threading.Lock()
+        self.clients = {}
+        self.resources = {}
+        self.pool_stats = {}
+
+    def service_config(self, service: str) -> Config:
+        settings = {
+            "max_pool_connections": AWS_MAX_POOL_CONNECTIONS,
+            "connect_timeout": AWS_CONNECT_TIMEOUT_IN_SECS,
+            "read_timeout": AWS_READ_TIMEOUT_IN_SECS,
+            "tcp_keepalive": AWS_TCP_KEEPALIVE,
+            "retries": {"mode": AWS_RETRY_MODE, "total_max_attempts": AWS_MAX_ATTEMPTS},
+        }
+        settings.update(SERVICE_CONFIG.get(service, {}))
+        return Config(**settings)
+
+    def _get_session(self):
+        # Loading botocore data is deferred to the first client
+        if self.session is None:
+            self.session = boto3.session.Session(
+                aws_access_key_id=AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                region_name=REGION_NAME,
+            )
+        return self.session
+
+    def _track(self, name: str, client, config: Config):
+        stats = NoloPoolStats(name, config.max_pool_connections)
+        stats.register(client)
+        self.pool_stats[name] = stats
+
+    def client(self, service: str):
+        """
+        Shared client for service, created on first use
+        """
+        client = self.clients.get(service)
+        if client is not None:
+            return client
+        with self.lock:
+            if service not in self.clients:
+                config = self.service_config(service)
+                client = self._get_session().client(service, config=config)
+                self._track(service, client, config)
+                self.clients[service] = client
+                logger.info(f"AWS {service} client Created")
+            return self.clients[service]
+
+    def resource(self, service: str):
+        """
+        Shared resource for service. It wraps its own client, tracked
+        apart from the one returned by client()
+        """
+        resource = self.resources.get(service)
+        if resource is not None:
+            return resource
+        with self.lock:
+            if service not in self.resources:
+                config = self.service_config(service)
+                resource = self._get_session().resource(service, config=config)
+                self._track(f"{service}-resource", resource.meta.client, config)
+                self.resources[service] = resource
+                logger.info(f"AWS {service} resource Created")
+            return self.resources[service]
+
+    def stats(self) -> dict:
+        with self.lock:
+            pool_stats = dict(self.pool_stats)
+        return {name: stats.stats() for name, stats in pool_stats.items()}
+
+
+# Shared AWS Clients
+aws_clients = NoloAWSClients()
@@ -0,0 +1,76 @@
+import os
+import hashlib
+import threading
+from utils.lru_cache import NoloLRUCache
+from handlers.s3_handler import presign_min_validity
+import logging
+
+
+# Create Logger
+logger = logging.getLogger(__name__)
+
+# Cache Settings
+BOOKSHELF_CACHE_TTL_IN_SECS = int(os.getenv("BOOKSHELF_CACHE_TTL_IN_SECS", "300"))
+BOOKSHELF_KEY = "bookshelf"
+
+
+class NoloBookshelfCache:
+    """
+    Pre-serialised Bookshelf response with its ETag. Write paths call
+    invalidate, the TTL keeps the cover URLs inside their validity.
+    Invalidation is process local: other API workers keep serving their
+    copy until it expires, so BOOKSHELF_CACHE_TTL_IN_SECS bounds how
+    stale the shelf can be across workers
+    """
+
+    def __init__(self, ttl_in_secs=None):
+        # Cover URLs may come from the presign cache, already part way
+        # through their lifetime
+        self.ttl = min(
+            ttl_in_secs or BOOKSHELF_CACHE_TTL_IN_SECS, presign_min_validity()
+        )
+        self.cache = NoloLRUCache(max_entries=1, ttl_in_secs=self.ttl)
+        self.lock = threading.Lock()
+        self.generation = 0
+        logger.info("NoloBookshelfCache Created")
+
+    def get_or_build(self, build) -> tuple[bytes, str]:
+        """
+        Return (body, etag). On a miss build() returns the JSON body, it
+        is only stored if no write invalidated the shelf meanwhile
+        """
+        entry = self.cache.get(BOOKSHELF_KEY)
+        if entry is not None:
+            return entry
+
+        with self.lock:
+            generation = self.generation
+        body = build()
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        with self.lock:
+            if generation == self.generation:
+                self.cache.put(BOOKSHELF_KEY, (body, etag))
+        return body, etag
+
+    def invalidate(self, reason: str = ""):
+        with self.lock:
+            self.generation += 1
+            self.cache.pop(BOOKSHELF_KEY)
+        logger.info(f"Bookshelf cache invalidated {reason}".strip())
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    True when the If-None-Match header covers etag
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag.removeprefix("W/") for tag in tags]
+
+
+# Shared Bookshelf Cache
+bookshelf_cache = NoloBookshelfCache()
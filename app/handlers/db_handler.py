@@ -1,42 +1,188 @@
-import boto3
+from typing import Dict, List
 import os
+import json
+import base64
 import logging
-from models.iam_model import User, UserInDB
-from settings.nolo_config import NoloCFG
+from decimal import Decimal
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError, ParamValidationError
+from concurrent.futures import ThreadPoolExecutor
+from models.iam_model import UserInDB
+from utils.lru_cache import NoloLRUCache
+from utils.io_pool import io_pool
+from handlers.aws_handler import aws_clients
 
 
 # Create Logger
 logger = logging.getLogger(__name__)
 
-# Load ENV data
-# load_dotenv()
-cfg = NoloCFG()
-
-# Load AWS Env
-# AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-# AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-# REGION_NAME = os.getenv("AWS_DEFAULT_REGION")
-
-AWS_ACCESS_KEY_ID = cfg.aws_access_key_id
-AWS_SECRET_ACCESS_KEY = cfg.aws_secret_access_key_id
-REGION_NAME = cfg.aws_default_region
-
-# Global AWS Client
-client = boto3.client(
-    "dynamodb",
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=REGION_NAME,
-    # config=Config(signature_version="v4"),
-)
+# Scan Settings
+DDB_SCAN_SEGMENTS = int(os.getenv("DDB_SCAN_SEGMENTS", "4"))
+
+# Batch Limits
+DDB_BATCH_GET_MAX_KEYS = 100
 
-resource = boto3.resource(
-    "dynamodb",
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=REGION_NAME,
-    # config=Config(signature_version="v4"),
+# User Cache Settings
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "4096"))
+USER_CACHE_TTL_IN_SECS = int(os.getenv("USER_CACHE_TTL_IN_SECS", "60"))
+USER_CACHE_NEGATIVE_TTL_IN_SECS = int(
+    os.getenv("USER_CACHE_NEGATIVE_TTL_IN_SECS", "10")
 )
+NO_USER = False  # negative cache entry
+
+# Booklet Indexes
+OWNER_INDEX_NAME = "owner_id-modify_at-index"
+PUBLISHED_INDEX_NAME = "published_shelf-modify_at-index"
+# Sparse partition key of the published index, only set on published booklets
+PUBLISHED_SHELF = "published"
+
+
+def _json_number(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode_cursor(state) -> str:
+    """
+    Opaque cursor for DynamoDB start keys
+    """
+    data = json.dumps(state, default=_json_number)
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """
+    Inverse of encode_cursor, raise ValueError on a malformed cursor
+    """
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception as e:
+        raise ValueError(f"Malformed cursor: {e}")
+
+
+def is_start_key(key) -> bool:
+    return isinstance(key, dict) and bool(key) and all(isinstance(k, str) for k in key)
+
+
+def is_bad_start_key(error: Exception) -> bool:
+    """
+    True when DynamoDB or boto3 refused an ExclusiveStartKey taken from
+    a cursor, the key shape does not match the table or index
+    """
+    if isinstance(error, ClientError):
+        return error.response["Error"]["Code"] == "ValidationException"
+    return isinstance(error, (TypeError, ParamValidationError))
+
+
+def set_published_shelf(item: dict) -> dict:
+    """
+    Keep the sparse published index key in line with is_published
+    """
+    if item.get("is_published"):
+        item["published_shelf"] = PUBLISHED_SHELF
+    else:
+        item.pop("published_shelf", None)
+    return item
+
+
+def counter_update(
+    item_key: Dict,
+    attributes: Dict,
+    expected_counter=None,
+    remove: List[str] = None,
+) -> Dict:
+    """
+    Update request that SETs only the given attributes, dotted keys reach
+    nested elements like elements.text, and bumps update_counter. The
+    write is conditional on the counter read with the item (None when the
+    item has none yet)
+    """
+    # Init Update expression
+    set_expressions = []
+
+    # Build  expression-attributes-names and values
+    expression_attrib_names = {"#update_counter": "update_counter"}
+    expression_attrib_values = {":_start": 0, ":_inc": 1}
+    for key, value in attributes.items():
+        if key in item_key:
+            continue
+        path = key.split(".")
+        expression_attrib_names.update({f"#{name}": name for name in path})
+        placeholder = ":" + "_".join(path)
+        set_expressions.append(
+            f"{'.'.join(f'#{name}' for name in path)} = {placeholder}"
+        )
+        expression_attrib_values[placeholder] = value
+
+    # Finish update-expression
+    set_expressions.append(
+        "#update_counter = if_not_exists(#update_counter, :_start) + :_inc"
+    )
+    update_expression = "SET " + ", ".join(set_expressions)
+    if remove:
+        update_expression += " REMOVE " + ", ".join(f"#{key}" for key in remove)
+        expression_attrib_names.update({f"#{key}": key for key in remove})
+
+    # Optimistic concurrency on the version read with the item
+    key_name = next(iter(item_key))
+    expression_attrib_names[f"#{key_name}"] = key_name
+    if expected_counter is None:
+        condition = (
+            f"attribute_exists(#{key_name}) AND attribute_not_exists(#update_counter)"
+        )
+    else:
+        condition = f"attribute_exists(#{key_name}) AND #update_counter = :_expected"
+        expression_attrib_values[":_expected"] = expected_counter
+
+    return {
+        "Key": item_key,
+        "UpdateExpression": update_expression,
+        "ConditionExpression": condition,
+        "ExpressionAttributeNames": expression_attrib_names,
+        "ExpressionAttributeValues": expression_attrib_values,
+    }
+
+
+def update_item_and_counter(
+    table,
+    item_key: Dict,
+    attributes: Dict,
+    expected_counter=None,
+    remove: List[str] = None,
+) -> Dict:
+    """
+    Conditional counter_update of one item, a concurrent edit fails with
+    ConditionalCheckFailedException
+    """
+    return table.update_item(
+        **counter_update(item_key, attributes, expected_counter, remove),
+        ReturnValues="UPDATED_NEW",
+    )
+
+
+def transact_counter_updates(updates: List[tuple]):
+    """
+    Apply (table, counter_update) pairs all or nothing, a concurrent edit
+    of any of the items cancels the whole transaction
+    """
+    client = updates[0][0].meta.client
+    client.transact_write_items(
+        TransactItems=[
+            {"Update": {"TableName": table.name, **update}} for table, update in updates
+        ]
+    )
+
+
+def is_version_conflict(error: Exception) -> bool:
+    if not isinstance(error, ClientError):
+        return False
+    if error.response["Error"]["Code"] == "TransactionCanceledException":
+        return any(
+            reason.get("Code") == "ConditionalCheckFailed"
+            for reason in error.response.get("CancellationReasons", [])
+        )
+    return error.response["Error"]["Code"] == "ConditionalCheckFailedException"
 
 
 class NoloDBHandler:
@@ -44,8 +190,11 @@ class NoloDBHandler:
     Dynamo DB Handler for Nolo Reader
     """
 
-    def __init__(self, table_name=None):
+    def __init__(self, table_name=None, pages_table_name=None):
         self.table_name = table_name or os.getenv("API_DDB_TABLE_NAME")
+        self.pages_table_name = pages_table_name or os.getenv(
+            "API_DDB_PAGES_TABLE_NAME"
+        )
         logger.info("NoloDBHandler Created")
 
     def get_table(self):
@@ -53,7 +202,269 @@ class NoloDBHandler:
         Connect to DDB and get access to the table
         """
         logger.info("NoloDBHandler Table Conn Created")
-        return resource.Table(self.table_name)
+        return aws_clients.resource("dynamodb").Table(self.table_name)
+
+    # Pages: one item per page, keyed by doc_id and page_num
+    def get_pages_table(self):
+        return aws_clients.resource("dynamodb").Table(self.pages_table_name)
+
+    def put_pages(self, doc_id: str, pages: list):
+        """
+        Write every page of a booklet as its own item, replacing the page
+        set: pages left from a longer previous version are deleted after
+        """
+        with self.get_pages_table().batch_writer() as batch:
+            for page in pages:
+                batch.put_item(Item={**page, "doc_id": doc_id})
+        logger.info(f"Booklet {doc_id} {len(pages)} pages stored")
+        last_page = max((int(page["page_num"]) for page in pages), default=0)
+        self.delete_pages(doc_id, after_page=last_page)
+
+    def put_page(self, doc_id: str, page: dict):
+        self.get_pages_table().put_item(Item={**page, "doc_id": doc_id})
+
+    def get_pages(self, doc_id: str, first_page=None, last_page=None) -> list:
+        """
+        Pages of a booklet in page order, optionally limited to a range
+        """
+        key_condition = Key("doc_id").eq(doc_id)
+        if first_page is not None and last_page is not None:
+            key_condition &= Key("page_num").between(first_page, last_page)
+        elif first_page is not None:
+            key_condition &= Key("page_num").gte(first_page)
+        elif last_page is not None:
+            key_condition &= Key("page_num").lte(last_page)
+
+        table = self.get_pages_table()
+        kwargs = {"KeyConditionExpression": key_condition}
+        pages = []
+        while True:
+            response = table.query(**kwargs)
+            pages.extend(response["Items"])
+            if "LastEvaluatedKey" not in response:
+                return pages
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def get_pages_by_num(self, doc_id: str, page_nums) -> list:
+        """
+        Batch read of some pages of a booklet, in page order
+        """
+        keys = [{"doc_id": doc_id, "page_num": int(num)} for num in set(page_nums)]
+        pages = []
+        for start in range(0, len(keys), DDB_BATCH_GET_MAX_KEYS):
+            request = {
+                self.pages_table_name: {
+                    "Keys": keys[start : start + DDB_BATCH_GET_MAX_KEYS]
+                }
+            }
+            while request:
+                response = aws_clients.resource("dynamodb").batch_get_item(
+                    RequestItems=request
+                )
+                pages.extend(response["Responses"].get(self.pages_table_name, []))
+                request = response.get("UnprocessedKeys")
+        return sorted(pages, key=lambda page: page["page_num"])
+
+    def delete_pages(self, doc_id: str, after_page: int = None) -> int:
+        """
+        Delete every page item of a booklet, or only those past after_page
+        """
+        table = self.get_pages_table()
+        key_condition = Key("doc_id").eq(doc_id)
+        if after_page is not None:
+            key_condition &= Key("page_num").gt(after_page)
+        kwargs = {
+            "KeyConditionExpression": key_condition,
+            "ProjectionExpression": "doc_id, page_num",
+        }
+        deleted = 0
+        with table.batch_writer() as batch:
+            while True:
+                response = table.query(**kwargs)
+                for key in response["Items"]:
+                    batch.delete_item(Key=key)
+                    deleted += 1
+                if "LastEvaluatedKey" not in response:
+                    break
+                kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        logger.info(f"Booklet {doc_id} {deleted} pages deleted")
+        return deleted
+
+    def _scan_segment(self, projection, segment, total_segments, start_key, limit):
+        kwargs = {
+            "ProjectionExpression": projection,
+            "Segment": segment,
+            "TotalSegments": total_segments,
+        }
+        if start_key:
+            kwargs["ExclusiveStartKey"] = start_key
+        if limit:
+            kwargs["Limit"] = limit
+        return self.get_table().scan(**kwargs)
+
+    def scan_all(self, projection: str, total_segments=None) -> list:
+        """
+        Full table scan, segments run in parallel and each one follows
+        its LastEvaluatedKey to the end
+        """
+        total_segments = total_segments or DDB_SCAN_SEGMENTS
+
+        def scan_segment(segment):
+            items, start_key = [], None
+            while True:
+                response = self._scan_segment(
+                    projection, segment, total_segments, start_key, None
+                )
+                items.extend(response["Items"])
+                start_key = response.get("LastEvaluatedKey")
+                if not start_key:
+                    return items
+
+        with ThreadPoolExecutor(max_workers=total_segments) as pool:
+            segments = pool.map(scan_segment, range(total_segments))
+            return [item for items in segments for item in items]
+
+    def scan_page(
+        self,
+        projection: str,
+        limit: int,
+        cursor=None,
+        total_segments=None,
+        key_names=("doc_id",),
+    ) -> tuple[list, str | None]:
+        """
+        One page of at most limit items from a parallel scan. Every
+        unfinished segment reads its share of limit, items past limit are
+        left to the next page: the cursor of a trimmed segment restarts
+        after its last returned item, so projection must hold key_names
+        """
+        total_segments = total_segments or DDB_SCAN_SEGMENTS
+        if cursor:
+            # One LastEvaluatedKey per segment, None marks a finished one
+            # and {} one that was not read yet
+            start_keys = decode_cursor(cursor)
+            if (
+                not isinstance(start_keys, list)
+                or len(start_keys) != total_segments
+                or not all(key in (None, {}) or is_start_key(key) for key in start_keys)
+            ):
+                raise ValueError("Cursor does not match the scan segments")
+            segments = [seg for seg, key in enumerate(start_keys) if key is not None]
+        else:
+            start_keys = [None] * total_segments
+            segments = list(range(total_segments))
+        segment_limit = max(1, -(-limit // len(segments))) if segments else 0
+
+        def scan_segment(segment):
+            response = self._scan_segment(
+                projection,
+                segment,
+                total_segments,
+                start_keys[segment],
+                segment_limit,
+            )
+            return segment, response
+
+        items = []
+        next_keys = [None] * total_segments
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, len(segments))) as pool:
+                for segment, response in pool.map(scan_segment, segments):
+                    segment_items = response["Items"][: max(0, limit - len(items))]
+                    items.extend(segment_items)
+                    next_keys[segment] = response.get("LastEvaluatedKey")
+                    if len(segment_items) < len(response["Items"]):
+                        # Trimmed, resume after the last item returned
+                        last_item = segment_items[-1] if segment_items else None
+                        next_keys[segment] = (
+                            {name: last_item[name] for name in key_names}
+                            if last_item
+                            else start_keys[segment] or {}
+                        )
+        except Exception as e:
+            if cursor and is_bad_start_key(e):
+                raise ValueError(f"Cursor does not match the table: {e}")
+            raise
+
+        if all(key is None for key in next_keys):
+            return items, None
+        return items, encode_cursor(next_keys)
+
+    def query_index(
+        self,
+        index_name: str,
+        key_name: str,
+        key_value,
+        limit: int,
+        cursor=None,
+        newest_first=True,
+    ) -> tuple[list, str | None]:
+        """
+        One page of a GSI Query, return the items and the next cursor
+        """
+        kwargs = {
+            "IndexName": index_name,
+            "KeyConditionExpression": Key(key_name).eq(key_value),
+            "ScanIndexForward": not newest_first,
+            "Limit": limit,
+        }
+        if cursor:
+            start_key = decode_cursor(cursor)
+            if not is_start_key(start_key) or start_key.get(key_name) != key_value:
+                raise ValueError("Cursor does not match the query")
+            kwargs["ExclusiveStartKey"] = start_key
+
+        try:
+            response = self.get_table().query(**kwargs)
+        except Exception as e:
+            if cursor and is_bad_start_key(e):
+                raise ValueError(f"Cursor does not match the index: {e}")
+            raise
+        start_key = response.get("LastEvaluatedKey")
+        return response["Items"], encode_cursor(start_key) if start_key else None
+
+    # Async API, the blocking boto3 calls run on the shared I/O pool
+    async def async_get_item(self, key: dict, projection: str = None) -> dict | None:
+        kwargs = {"Key": key}
+        if projection:
+            kwargs["ProjectionExpression"] = projection
+        response = await io_pool.run(self.get_table().get_item, **kwargs)
+        return response.get("Item")
+
+    async def async_put_item(self, item: dict):
+        return await io_pool.run(self.get_table().put_item, Item=item)
+
+    async def async_delete_item(self, key: dict):
+        return await io_pool.run(self.get_table().delete_item, Key=key)
+
+    async def async_put_pages(self, doc_id: str, pages: list):
+        return await io_pool.run(self.put_pages, doc_id, pages)
+
+    async def async_get_pages(self, doc_id: str, first_page=None, last_page=None):
+        return await io_pool.run(self.get_pages, doc_id, first_page, last_page)
+
+    async def async_get_pages_by_num(self, doc_id: str, page_nums) -> list:
+        return await io_pool.run(self.get_pages_by_num, doc_id, list(page_nums))
+
+    async def async_delete_pages(self, doc_id: str, after_page: int = None) -> int:
+        return await io_pool.run(self.delete_pages, doc_id, after_page)
+
+    async def async_scan_all(self, projection: str) -> list:
+        return await io_pool.run(self.scan_all, projection)
+
+    async def async_scan_page(self, projection: str, limit: int, cursor=None):
+        return await io_pool.run(self.scan_page, projection, limit, cursor)
+
+    async def async_query_index(
+        self, index_name: str, key_name: str, key_value, limit: int, cursor=None
+    ):
+        return await io_pool.run(
+            self.query_index, index_name, key_name, key_value, limit, cursor
+        )
+
+
+# Shared User Cache, keyed by username
+user_cache = NoloLRUCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_IN_SECS)
 
 
 class NoloUserDB:
@@ -63,9 +474,16 @@ class NoloUserDB:
 
     def __init__(self):
         self.user_db = os.getenv("USER_DDB_TABLE_NAME")
-        self.table = resource.Table(self.user_db)
+        self._table = None
         logger.info("NoloUserDB Object Created")
 
+    @property
+    def table(self):
+        # The DynamoDB resource is only built on the first query
+        if self._table is None:
+            self._table = aws_clients.resource("dynamodb").Table(self.user_db)
+        return self._table
+
     def get_one_user(self, username: str) -> UserInDB:
         table = self.table
         response = table.get_item(Key={"username": username})
@@ -78,6 +496,30 @@ class NoloUserDB:
         logger.info(f"User {username} Object Found ")
         return UserInDB(**user)
 
+    async def get_cached_user(self, username: str) -> UserInDB | None:
+        """
+        get_one_user behind the user cache, missing users are cached for a
+        shorter time. Only a cache miss leaves the event loop
+        """
+        user = user_cache.get(username)
+        if user is NO_USER:
+            return None
+        if user is not None:
+            return user
+
+        user = await self.async_get_one_user(username)
+        if user is None:
+            user_cache.put(username, NO_USER, USER_CACHE_NEGATIVE_TTL_IN_SECS)
+        else:
+            user_cache.put(username, user)
+        return user
+
+    def invalidate_user(self, username: str):
+        """
+        Drop a cached user, call it whenever the user item changes
+        """
+        user_cache.pop(username)
+
     def get_all_users(self) -> dict:
         table = self.table
         response = table.scan(
@@ -88,17 +530,29 @@ class NoloUserDB:
         logger.info("UserList Object Found ")
         return data
 
-    def insert_user(self, user: User):
+    def insert_user(self, user: dict):
         table = self.table
         response = table.put_item(Item=user)
+        self.invalidate_user(user["username"])
         status_code = response["ResponseMetadata"]["HTTPStatusCode"]
-        logger.info(f"User {user.username} Object created ")
+        logger.info(f"User {user['username']} Object created ")
         return status_code
 
     def delete_user(self, username: str):
         table = self.table
         response = table.delete_item(Key={"username": username})
+        self.invalidate_user(username)
         status_code = response["ResponseMetadata"]["HTTPStatusCode"]
 
         logger.info(f"User {username} Object deleted ")
         return status_code
+
+    # Async API, the blocking boto3 calls run on the shared I/O pool
+    async def async_get_one_user(self, username: str) -> UserInDB | None:
+        return await io_pool.run(self.get_one_user, username)
+
+    async def async_insert_user(self, user: dict):
+        return await io_pool.run(self.insert_user, user)
+
+    async def async_delete_user(self, username: str):
+        return await io_pool.run(self.delete_user, username)
@@ -1,8 +1,10 @@
 import os
+import hashlib
 from typing import Annotated
 from fastapi import Depends, HTTPException, status
 from jose import JWTError, jwt
 from handlers.db_handler import NoloUserDB
+from utils.lru_cache import NoloLRUCache
 from models.jwt_model import TokenData
 from models.iam_model import User
 from fastapi.security import OAuth2PasswordBearer
@@ -11,6 +13,7 @@ import logging
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 REFRESH_KEY = os.getenv("JWT_REFRESH_SECRET_KEY")
 ALGORITHM = os.getenv("JWT_ALGORITHM")
+JWT_CACHE_MAX_ENTRIES = int(os.getenv("JWT_CACHE_MAX_ENTRIES", "10000"))
 
 # Create Logger
 logger = logging.getLogger(__name__)
@@ -22,6 +25,25 @@ user_ddb = os.getenv("USER_DDB_TABLE_NAME")
 # Handlers
 user_db = NoloUserDB()
 
+# Verified Tokens, sha256 of the token -> username, each expires at its exp
+token_cache = NoloLRUCache(JWT_CACHE_MAX_ENTRIES)
+
+
+def verify_token(token: str) -> str | None:
+    """
+    Username of a valid access token, decoded once per token
+    """
+    digest = hashlib.sha256(token.encode()).hexdigest()
+    username = token_cache.get(digest)
+    if username is not None:
+        return username
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    username = payload.get("sub")
+    if username is not None and payload.get("exp") is not None:
+        token_cache.put(digest, username, expires_at=payload["exp"])
+    return username
+
 
 async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
     credentials_exception = HTTPException(
@@ -30,15 +52,14 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
+        username: str = verify_token(token)
         if username is None:
             raise credentials_exception
         token_data = TokenData(username=username)
     except JWTError as e:
         logger.error(e)
         raise credentials_exception
-    user = user_db.get_one_user(username=token_data.username)
+    user = await user_db.get_cached_user(token_data.username)
     if user is None:
         logger.error("Not User in DB")
         raise credentials_exception
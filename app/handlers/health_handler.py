@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from handlers.aws_handler import aws_clients
+import logging
+
+
+# Create Logger
+logger = logging.getLogger(__name__)
+
+# Warm-up Settings
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "4"))
+WARMUP_RETRY_MAX_IN_SECS = int(os.getenv("WARMUP_RETRY_MAX_IN_SECS", "30"))
+
+# Step States
+STEP_PENDING = "pending"
+STEP_RETRYING = "retrying"
+STEP_DONE = "done"
+
+
+def open_connections(call):
+    """
+    Run call WARMUP_CONNECTIONS times at once, so the client pool starts
+    with that many TLS connections open. An AWS error response still
+    proves the endpoint is reachable and leaves its connection pooled
+    """
+    with ThreadPoolExecutor(max_workers=WARMUP_CONNECTIONS) as pool:
+        futures = [pool.submit(call) for _ in range(WARMUP_CONNECTIONS)]
+    for future in futures:
+        try:
+            future.result()
+        except ClientError as e:
+            logger.info(f"Warm-up call answered with {e.response['Error']['Code']}")
+
+
+def warm_langdetect():
+    from langdetect.detector_factory import init_factory
+
+    init_factory()
+
+
+def warm_dynamodb():
+    # Reads and writes go through the resource client
+    client = aws_clients.resource("dynamodb").meta.client
+    open_connections(
+        partial(client.describe_table, TableName=os.getenv("API_DDB_TABLE_NAME"))
+    )
+
+
+def warm_s3():
+    client = aws_clients.client("s3")
+    open_connections(partial(client.head_bucket, Bucket=os.getenv("BUCKET_NAME")))
+
+
+class NoloWarmup:
+    """
+    Startup work run on a background thread. The readiness probe only
+    turns green once every step is done, failed steps are retried with
+    backoff
+    """
+
+    def __init__(self, steps: dict):
+        self.steps = steps
+        self.status = {name: STEP_PENDING for name in steps}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.started_at = None
+        self.ready_in_secs = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.started_at = time.perf_counter()
+            self.thread = threading.Thread(
+                target=self.run, name="nolo-warmup", daemon=True
+            )
+        self.thread.start()
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=len(self.steps)) as pool:
+            for name, step in self.steps.items():
+                pool.submit(self._run_step, name, step)
+        self.ready_in_secs = round(time.perf_counter() - self.started_at, 3)
+        logger.info(f"Warm-up done in {self.ready_in_secs}s")
+
+    def _run_step(self, name: str, step):
+        delay = 1
+        while True:
+            started_at = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                with self.lock:
+                    self.status[name] = STEP_RETRYING
+                logger.warning(
+                    f"Warm-up step {name} failed, retry in {delay}s. REASON: {e}"
+                )
+                time.sleep(delay)
+                delay = min(delay * 2, WARMUP_RETRY_MAX_IN_SECS)
+                continue
+            with self.lock:
+                self.status[name] = STEP_DONE
+            logger.info(
+                f"Warm-up step {name} done in {time.perf_counter() - started_at:.2f}s"
+            )
+            return
+
+    @property
+    def ready(self) -> bool:
+        with self.lock:
+            return all(status == STEP_DONE for status in self.status.values())
+
+    def report(self) -> dict:
+        with self.lock:
+            steps = dict(self.status)
+        return {
+            "ready": all(status == STEP_DONE for status in steps.values()),
+            "ready_in_secs": self.ready_in_secs,
+            "steps": steps,
+        }
+
+
+# Shared Warm-up
+warmup = NoloWarmup(
+    {"langdetect": warm_langdetect, "dynamodb": warm_dynamodb, "s3": warm_s3}
+)
@@ -0,0 +1,352 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from uuid import uuid4
+from handlers.db_handler import NoloDBHandler, set_published_shelf
+from handlers.cache_handler import bookshelf_cache
+import logging
+
+
+# Create Logger
+logger = logging.getLogger(__name__)
+
+# Queue Settings
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "./data/jobs.db")
+JOB_POLL_INTERVAL_IN_SECS = float(os.getenv("JOB_POLL_INTERVAL_IN_SECS", "2"))
+JOB_STALE_AFTER_IN_SECS = int(os.getenv("JOB_STALE_AFTER_IN_SECS", "900"))
+JOB_HEARTBEAT_INTERVAL_IN_SECS = int(os.getenv("JOB_HEARTBEAT_INTERVAL_IN_SECS", "60"))
+JOB_MAX_WORKERS = int(os.getenv("JOB_MAX_WORKERS", "1"))
+
+# Job States
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+CREATE_JOBS_TABLE = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    doc_title TEXT,
+    doc_description TEXT,
+    owner_id TEXT NOT NULL,
+    doc_id TEXT,
+    pages_total INTEGER NOT NULL DEFAULT 0,
+    pages TEXT NOT NULL DEFAULT '[]',
+    error TEXT,
+    page_report TEXT,
+    claim_id TEXT,
+    created_at INTEGER NOT NULL,
+    modify_at INTEGER NOT NULL
+)
+"""
+
+
+def load_pdf_handler():
+    """
+    NoloPDFHandler class. The PDF pipeline (MuPDF, langdetect, OpenAI,
+    Polly) is only imported by the first booklet that needs it
+    """
+    from handlers.pdf_handler import NoloPDFHandler
+
+    return NoloPDFHandler
+
+
+def remove_upload(file_path: str):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Upload {file_path} not removed. REASON: {e}")
+
+
+class NoloJobQueue:
+    """
+    Durable SQLite Queue for Booklet Ingest Jobs
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or JOB_DB_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None
+        )
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(CREATE_JOBS_TABLE)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "claim_id" not in columns:
+            # Queues created before jobs had an owning claim
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN claim_id TEXT")
+        logger.info("NoloJobQueue Created")
+
+    def _to_dict(self, row) -> dict | None:
+        if row is None:
+            return None
+        job = dict(row)
+        job["pages"] = json.loads(job["pages"])
+        job["page_report"] = json.loads(job["page_report"] or "null")
+        job["pages_done"] = len(job["pages"])
+        return job
+
+    def enqueue(
+        self,
+        file_path: str,
+        file_name: str,
+        title: str,
+        description: str,
+        owner_id: str,
+    ) -> dict:
+        """
+        Persist a new ingest job
+        """
+        job_id = uuid4().hex
+        now = int(time.time())
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO jobs (job_id, status, file_path, file_name, doc_title,"
+                " doc_description, owner_id, created_at, modify_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    JOB_QUEUED,
+                    file_path,
+                    file_name,
+                    title,
+                    description,
+                    owner_id,
+                    now,
+                    now,
+                ),
+            )
+        logger.info(f"Job {job_id} for Booklet {file_name} queued")
+        return self.get_job(job_id)
+
+    def claim_next(self) -> dict | None:
+        """
+        Atomically move the oldest queued (or stale running) job to running
+        under a new claim_id. A worker whose claim was taken over can no
+        longer write the job
+        """
+        now = int(time.time())
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT job_id FROM jobs WHERE status = ?"
+                    " OR (status = ? AND modify_at < ?)"
+                    " ORDER BY created_at LIMIT 1",
+                    (JOB_QUEUED, JOB_RUNNING, now - JOB_STALE_AFTER_IN_SECS),
+                ).fetchone()
+                if row is None:
+                    self.conn.execute("COMMIT")
+                    return None
+                self.conn.execute(
+                    "UPDATE jobs SET status = ?, pages = '[]', claim_id = ?,"
+                    " modify_at = ? WHERE job_id = ?",
+                    (JOB_RUNNING, uuid4().hex, now, row["job_id"]),
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return self.get_job(row["job_id"])
+
+    def _update_claimed(self, job: dict, assignments: str, values: tuple) -> bool:
+        """
+        UPDATE a running job only while job holds its claim, call it with
+        the queue lock held
+        """
+        cursor = self.conn.execute(
+            f"UPDATE jobs SET {assignments}, modify_at = ?"
+            " WHERE job_id = ? AND status = ? AND claim_id = ?",
+            (*values, int(time.time()), job["job_id"], JOB_RUNNING, job["claim_id"]),
+        )
+        if cursor.rowcount == 0:
+            logger.warning(f"Job {job['job_id']} claim lost, update dropped")
+            return False
+        return True
+
+    def heartbeat(self, job: dict) -> bool:
+        """
+        Keep a claimed job from turning stale while a page runs long
+        """
+        with self.lock:
+            return self._update_claimed(job, "status = status", ())
+
+    def start(self, job: dict, doc_id: str, pages_total: int) -> bool:
+        with self.lock:
+            return self._update_claimed(
+                job, "doc_id = ?, pages_total = ?", (doc_id, pages_total)
+            )
+
+    def page_done(self, job: dict, page_num: int) -> bool:
+        """
+        Record a completed page
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT pages FROM jobs WHERE job_id = ?", (job["job_id"],)
+            ).fetchone()
+            pages = sorted(set(json.loads(row["pages"])) | {page_num})
+            return self._update_claimed(job, "pages = ?", (json.dumps(pages),))
+
+    def complete(self, job: dict, page_report: dict = None) -> bool:
+        with self.lock:
+            done = self._update_claimed(
+                job,
+                "status = ?, page_report = ?, error = NULL",
+                (JOB_DONE, json.dumps(page_report)),
+            )
+        if done:
+            logger.info(f"Job {job['job_id']} completed")
+        return done
+
+    def fail(self, job: dict, error: str) -> bool:
+        with self.lock:
+            failed = self._update_claimed(
+                job, "status = ?, error = ?", (JOB_FAILED, error)
+            )
+        if failed:
+            logger.error(f"Job {job['job_id']} failed. REASON: {error}")
+        return failed
+
+    def get_job(self, job_id: str) -> dict | None:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._to_dict(row)
+
+    def get_jobs_by_owner(self, owner_id: str) -> list:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM jobs WHERE owner_id = ? ORDER BY created_at DESC",
+                (owner_id,),
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+
+class NoloIngestWorker:
+    """
+    Background Worker pulling Booklet Jobs from the queue
+    """
+
+    def __init__(self, queue: NoloJobQueue, db: NoloDBHandler, max_workers=None):
+        self.queue = queue
+        self.db = db
+        self.max_workers = max_workers or JOB_MAX_WORKERS
+        self.tasks = []
+        logger.info("NoloIngestWorker Created")
+
+    def start(self):
+        for _ in range(self.max_workers):
+            self.tasks.append(asyncio.create_task(self.run()))
+        logger.info(f"{self.max_workers} Ingest Workers started")
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        logger.info("Ingest Workers stopped")
+
+    async def run(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.queue.claim_next)
+                if job is None:
+                    await asyncio.sleep(JOB_POLL_INTERVAL_IN_SECS)
+                    continue
+                await self.process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingest Worker loop failed. REASON: {e}")
+                await asyncio.sleep(JOB_POLL_INTERVAL_IN_SECS)
+
+    async def heartbeat(self, job: dict):
+        """
+        Renew the claim on the job every JOB_HEARTBEAT_INTERVAL_IN_SECS,
+        independent of page progress
+        """
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL_IN_SECS)
+            if not await asyncio.to_thread(self.queue.heartbeat, job):
+                return
+
+    async def process(self, job: dict):
+        """
+        Run the PDF pipeline for a job and store the booklet in DynamoDB
+        """
+        heartbeat = asyncio.create_task(self.heartbeat(job))
+        try:
+            await self._process(job)
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+    async def _process(self, job: dict):
+        job_id = job["job_id"]
+        logger.info(f"Job {job_id} for Booklet {job['file_name']} started!")
+        try:
+            # The first import is slow, keep it off the event loop
+            NoloPDFHandler = await asyncio.to_thread(load_pdf_handler)
+            pdf_handler = NoloPDFHandler(
+                file_name=job["file_name"], description=job["doc_description"]
+            )
+
+            # SQLite writes wait on the queue lock, keep them off the event loop
+            async def on_page_done(page_num: int):
+                await asyncio.to_thread(self.queue.page_done, job, page_num)
+
+            async def on_start(pages_total: int):
+                await asyncio.to_thread(
+                    self.queue.start, job, pdf_handler.hashed_fname, pages_total
+                )
+
+            response = await pdf_handler.async_process_file(
+                job["file_path"], on_start=on_start, on_page_done=on_page_done
+            )
+            if not response:
+                await self.fail(job, "Failed to process Booklet")
+                return
+
+            file_metadata = pdf_handler.get_file_metadata()
+            file_metadata.update(
+                {
+                    "owner_id": job["owner_id"],
+                    "is_published": True,
+                    "doc_title": job["doc_title"],
+                    "doc_description": job["doc_description"],
+                }
+            )
+            set_published_shelf(file_metadata)
+
+            # Send the pages and then the booklet header to DynamoDB
+            pages = file_metadata.pop("pages")
+            await self.db.async_put_pages(file_metadata["doc_id"], pages)
+            await self.db.async_put_item(file_metadata)
+            bookshelf_cache.invalidate(f"by upload of {pdf_handler.hashed_fname}")
+            if await asyncio.to_thread(
+                self.queue.complete, job, pdf_handler.get_classifier_report()
+            ):
+                remove_upload(job["file_path"])
+            logger.info(f"Booklet {job['file_name']} completed!")
+        except Exception as e:
+            await self.fail(job, str(e))
+
+    async def fail(self, job: dict, error: str):
+        """
+        Failed jobs are not retried, their upload is removed with them. A
+        job claimed by another worker meanwhile keeps its upload
+        """
+        if await asyncio.to_thread(self.queue.fail, job, error):
+            remove_upload(job["file_path"])
@@ -2,17 +2,21 @@ import time
 import io
 import os
 import hashlib
-from pdf2image import convert_from_bytes
 import fitz
 import asyncio
+import threading
 from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
 from langdetect import detect_langs
+from langdetect.detector_factory import init_factory
 from langdetect.lang_detect_exception import LangDetectException
 from handlers.s3_handler import NoloBlobAPI
 from handlers.tts_handler import NoloTTS
 from handlers.ai_handler import NoloAIHelper
+from handlers.aws_handler import aws_clients
 from utils.text_cleaner import NoloCleaner
+from utils.img_hash import dhash, pixmap_to_gray
+from utils.page_classifier import NoloPageClassifier, PAGE_PICTURE
 import logging
 import shutil
 
@@ -22,9 +26,13 @@ logger = logging.getLogger(__name__)
 # Utils Import
 cleaner = NoloCleaner()
 polly = NoloTTS()
-tts_client = polly.client
+blob = NoloBlobAPI()
 noloai = NoloAIHelper()
 
+# Pipeline Settings
+MAX_PAGE_WORKERS = int(os.getenv("PDF_MAX_PAGE_WORKERS", "8"))
+MAX_INFLIGHT_PAGES = int(os.getenv("PDF_MAX_INFLIGHT_PAGES", "4"))
+
 
 class NoloPDFHandler:
     """
@@ -32,7 +40,15 @@ class NoloPDFHandler:
     """
 
     def __init__(
-        self, file_name=None, path=None, out_path=None, img_dpi=72, description=None
+        self,
+        file_name=None,
+        path=None,
+        out_path=None,
+        img_dpi=72,
+        description=None,
+        max_workers=None,
+        max_inflight_pages=None,
+        doc_id=None,
     ):
         self.fname = file_name or os.getenv("PDF_FILE")
         self.description = description or ""
@@ -47,9 +63,16 @@ class NoloPDFHandler:
         self.img_dpi = img_dpi
         self.page_index = []
         self.hashed_fname = self.create_fname_hash()
+        if doc_id is not None:
+            # Handler for an existing Booklet
+            self.hashed_fname = doc_id
+            self.file_metadata["doc_id"] = doc_id
         # self.ouput_exists = self.create_dir() ## TODO: Remove after in-Memory
-        self.s3_client = NoloBlobAPI()
-        self.text_storage = {}  # In Memory Storage
+        self.s3_client = blob
+        self.max_workers = max_workers or MAX_PAGE_WORKERS
+        self.max_inflight_pages = max_inflight_pages or MAX_INFLIGHT_PAGES
+        self.doc_lock = threading.Lock()  # fitz.Document is not thread safe
+        self.classifier = NoloPageClassifier()
 
         logger.info("Booklet Handler Created")
 
@@ -112,6 +135,12 @@ class NoloPDFHandler:
 
         return self.file_metadata
 
+    def get_classifier_report(self) -> dict:
+        """
+        Return how many pages were blank, text only or sent to the AI
+        """
+        return self.classifier.get_report()
+
     def detect_text_language(self, text) -> tuple:
         """
         Detect Language in the extracted text
@@ -132,28 +161,56 @@ class NoloPDFHandler:
             return "err", 0
 
     # TTS
-    def create_tts_from_text(self, tts_dict: dict):
+    def create_tts_from_text(self, tts_dict: dict, s3_tts_file_name_key: str):
         """
-        Use AWS Polly to generate tts files in mp3 format
+        Use AWS Polly to generate tts files in mp3 format and store them in
+        S3, reusing the audio of any text already synthesised.
+        Return the future of the S3 upload
         """
         try:
-            VoiceId = "Penelope" if tts_dict["gender"] == "female" else "Miguel"
-
-            response = tts_client.synthesize_speech(
-                VoiceId=VoiceId,
-                OutputFormat="mp3",
-                Text=tts_dict.get("tts_text"),
-                Engine="standard",
-            )
-
-            audio_stream = io.BytesIO(response["AudioStream"].read())
-
-            logger.info("TTS Creation success!")
-            return audio_stream
+            return polly.store_tts(tts_dict, self.s3_client, s3_tts_file_name_key)
         except Exception as e:
             logger.error(f"TTS Creation failed: REASON: {e}", extra={"error": e})
             raise e
 
+    def refresh_page_sync(
+        self, page_num: int, text: str | None = None, img_text: str | None = None
+    ) -> dict:
+        """
+        Rebuild the S3 objects of an edited page. Only the elements given
+        are regenerated, the others keep their existing objects.
+        Return the updated page elements
+        """
+        label_num = f"{page_num:02}"
+        elements = {}
+        uploads = []
+
+        if text is not None:
+            text_data = self._store_text_sync(page_num, text, uploads)
+            elements.update(text_data)
+            elements["tts_url"] = self._text_tts_node_sync(page_num, text_data, uploads)
+            if elements["tts_url"] is None:
+                # Page text removed, drop the stale audio
+                self.s3_client.delete_file(
+                    f"tts/{self.hashed_fname}/{self.hashed_fname}_page_{label_num}.mp3"
+                )
+
+        if img_text is not None:
+            elements["img_text"] = img_text
+            elements["img_tts_url"] = self._img_tts_node_sync(
+                page_num, img_text or None, uploads
+            )
+            if elements["img_tts_url"] is None:
+                self.s3_client.delete_file(
+                    f"tts/{self.hashed_fname}/"
+                    f"{self.hashed_fname}_img_desc_page_{label_num}.mp3"
+                )
+
+        for upload in uploads:
+            upload.result()
+        logger.info(f"Page {page_num} of Booklet {self.hashed_fname} refreshed")
+        return elements
+
     # SYNCH Functions
     # TODO: Eliminate this functio
     def delete_files_objects(self) -> bool:
@@ -214,257 +271,315 @@ class NoloPDFHandler:
             return False
 
     # ASYNC Functions
-    async def async_extract_text_from_file(self, file_data: bytes) -> bool:
-        loop = asyncio.get_running_loop()
+    async def async_process_file(
+        self, file_source: bytes | str, on_start=None, on_page_done=None
+    ) -> str | bool:
+        """
+        Process every page of the booklet as an independent task graph
+        sharing a bounded pool of workers. Only max_inflight_pages pages are
+        alive at once so memory stays flat whatever the booklet size.
+        file_source is a path (read lazily by MuPDF) or the PDF bytes.
+        on_start and on_page_done are coroutine functions awaited with the
+        number of pages and each completed page number
+        """
+        booklet_file = None
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        tasks = []
         try:
-            with ThreadPoolExecutor() as pool:
-                result = await loop.run_in_executor(
-                    pool, self._extract_text_from_file_sync, file_data
+            if isinstance(file_source, str):
+                booklet_file = fitz.open(file_source)
+            else:
+                booklet_file = fitz.open("pdf", file_source)
+            number_of_pages = len(booklet_file)
+            self.file_metadata["number_of_pages"] = number_of_pages
+            self.file_metadata["pages"] = [None] * number_of_pages
+            if on_start is not None:
+                await on_start(number_of_pages)
+
+            # Load language profiles once before the nodes run in parallel
+            init_factory()
+
+            window = asyncio.Semaphore(self.max_inflight_pages)
+            async for page_num in self._iter_page_window(number_of_pages, window):
+                if any(t.done() and t.exception() for t in tasks):
+                    # Stop feeding pages once one of them failed
+                    window.release()
+                    break
+                task = asyncio.create_task(
+                    self._async_process_page(pool, page_num, booklet_file, on_page_done)
                 )
-            logger.info("Booklet Text extracted sucessfuly!")
-            return result
+                task.add_done_callback(lambda _: window.release())
+                tasks.append(task)
+            await asyncio.gather(*tasks)
+
+            self.file_metadata["tts_ready"] = True
+            logger.info(f"TTS Cache stats: {polly.cache.stats()}")
+            logger.info(f"AI Description Cache stats: {noloai.cache.stats()}")
+            logger.info(f"AWS Connection Pool stats: {aws_clients.stats()}")
+            logger.info(f"Page Classifier report: {self.get_classifier_report()}")
+            logger.info(f"Booklet {self.hashed_fname} processed sucessfuly!")
+            return self.hashed_fname
         except Exception as e:
-            logger.error(f"Text extraction failed: REASON: {e}", extra={"error": e})
+            logger.error(f"Booklet processing failed: REASON: {e}", extra={"error": e})
             return False
+        finally:
+            # A failed page cancels its siblings before they queue more nodes
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Nodes already running end on their own threads, the event loop
+            # does not wait for them
+            pool.shutdown(wait=False, cancel_futures=True)
+            if booklet_file is not None:
+                await asyncio.to_thread(self._close_document, booklet_file)
+            await asyncio.to_thread(noloai.cache.flush)
+
+    def _close_document(self, booklet_file):
+        # Wait for the node reading the document, if any
+        with self.doc_lock:
+            booklet_file.close()
+
+    async def _iter_page_window(self, number_of_pages: int, window):
+        """
+        Yield page numbers one at a time, waiting for a free slot in the window
+        """
+        for page_num in range(1, number_of_pages + 1):
+            await window.acquire()
+            yield page_num
 
-    async def async_create_image_from_file(self, file_data: bytes) -> bool:
+    async def _async_process_page(
+        self, pool, page_num: int, booklet_file, on_page_done=None
+    ):
+        """
+        Page Task Graph. A node only waits for the nodes it reads from:
+        text -> text tts, render + text lang -> ai description -> image tts.
+        S3 uploads run on the shared transfer manager, the page only waits
+        for them once all its nodes are done
+        """
         loop = asyncio.get_running_loop()
-        try:
-            with ThreadPoolExecutor() as pool:
-                result = await loop.run_in_executor(
-                    pool, self._create_image_from_file_sync, file_data
-                )
-            logger.info("Booklet Images extracted sucessfuly!")
-            return result
-        except Exception as e:
-            logger.error(f"Image extraction failed: REASON: {e}", extra={"error": e})
-            return False
+        uploads = []
+
+        text_node = loop.run_in_executor(
+            pool, self._text_node_sync, page_num, booklet_file, uploads
+        )
+        render_node = loop.run_in_executor(
+            pool, self._render_node_sync, page_num, booklet_file, uploads
+        )
+
+        text_data = await text_node
+        text_tts_node = loop.run_in_executor(
+            pool, self._text_tts_node_sync, page_num, text_data, uploads
+        )
+
+        img_data = await render_node
+        img_ai_desc = await loop.run_in_executor(
+            pool, self._ai_node_sync, img_data, text_data["lang"]
+        )
+        img_tts_url = await loop.run_in_executor(
+            pool, self._img_tts_node_sync, page_num, img_ai_desc, uploads
+        )
+        tts_url = await text_tts_node
+        await asyncio.gather(*[asyncio.wrap_future(upload) for upload in uploads])
+
+        self._set_page_metadata(
+            page_num, text_data, tts_url, img_data, img_ai_desc, img_tts_url
+        )
+        logger.info(f"Page {page_num} of Booklet {self.hashed_fname} completed")
+        if on_page_done is not None:
+            await on_page_done(page_num)
 
     # ASYNC Helper Functions
-    def _create_image_from_file_sync(self, file_data: bytes):
+    def _upload_tts(self, tts_dict: dict, s3_tts_file_name_key: str, uploads) -> str:
         """
-        Image Extraction Function
+        Create the TTS audio in S3 and return its presigned URL
         """
-        images = convert_from_bytes(file_data, dpi=self.img_dpi)
-        for page_num, image in enumerate(images, start=1):
-            # Create a Unique pageID
-            label_num = f"{page_num:02}"  # Format page number with leading 0
-            img_fname = f"{self.hashed_fname}_page_{label_num}.png"
-
-            # Capture Image Data
-            img_bytes = io.BytesIO()
-            image.save(img_bytes, "PNG")
-            img_bytes.seek(0)
-
-            # Upload to S3
-            s3_img_file_name_key = f"img/{self.hashed_fname}/{img_fname}"
-            self.s3_client.bucket.upload_fileobj(
-                img_bytes, self.s3_client.bucket_name, s3_img_file_name_key
-            )
+        uploads.append(self.create_tts_from_text(tts_dict, s3_tts_file_name_key))
 
-            # Calculate Presigned URL
-            presigned_url = self.s3_client.generate_presigned_url(
-                s3_img_file_name_key, expires=os.getenv("URL_EXPIRATION_IN_SECS")
-            )
-
-            # cover page
-            if page_num == 1:
-                self.file_metadata["cover_img"] = presigned_url
-
-            # Access Page MetaData
-            page_data = self.get_page_data_dict(page_num)
-
-            # AI Image Description. Create Logic to avoid sending
-            # Text_only images or blank imnages
-            # # Call Polly with a Different Gender (maybe female) from Text Reader
-
-            img_ai_desc_lang = "es" if page_data["elements"]["lang"] != "en" else "en"
-            logger.info("Sending Image to AI for Description")
-            img_ai_desc = noloai.nolo_ai_description(presigned_url, img_ai_desc_lang)
-            logger.info("Image Description from AI completed")
-
-            # Create Synth Voice for img_tts_url and presigned
-            if img_ai_desc is not None:
-                tts_text = img_ai_desc[:399] if len(img_ai_desc) > 399 else img_ai_desc
-                logger.info(f"Creating IMG TTS File for Page {label_num}")
-                # Send Only Text to Lang Detection and TTS
-                lang, prob = self.detect_text_language(img_ai_desc)
-                tts_dict = {
-                    "tts_text": tts_text.lower(),  # lower case for improve tts accuracy
-                    "doc_id": self.hashed_fname,
-                    "tts_file": f"{self.hashed_fname}_img_desc_page_{label_num}.mp3",
-                    "language": lang,
-                    "gender": "female",
-                }
-
-                tts_audio_stream = self.create_tts_from_text(tts_dict)
-                s3_tts_file_name_key = f"tts/{self.hashed_fname}/{self.hashed_fname}_img_desc_page_{label_num}.mp3"
-
-                # Upload to s3
-                self.s3_client.bucket.upload_fileobj(
-                    tts_audio_stream, self.s3_client.bucket_name, s3_tts_file_name_key
-                )
-
-                # Calculate Presigned URL
-                img_tts_presigned_url = self.s3_client.generate_presigned_url(
-                    s3_tts_file_name_key, expires=os.getenv("URL_EXPIRATION_IN_SECS")
-                )
+        # Calculate Presigned URL
+        return self.s3_client.generate_presigned_url(
+            s3_tts_file_name_key, expires=os.getenv("URL_EXPIRATION_IN_SECS")
+        )
 
-            else:
-                img_tts_presigned_url = None
-
-            logger.info("PDF Image Description Proccess competed!")
-
-            # Prepare Data Dictionary to send it to DB
-            logger.info("Prepare Booklet Data to DB competed! ")
-            if page_data is None:
-                """
-                New Page
-                """
-                logger.info(f"Creating Page {page_num} imaging info")
-                file_page = {}
-                file_page["master_doc"] = self.hashed_fname
-                file_page["page_num"] = page_num
-                file_page["page_id"] = f"pg_{page_num}_{uuid4().hex}"
-                file_page["file_name"] = img_fname
-                file_page["img_url"] = presigned_url
-                self.create_page_index_list(page_num, self.file_page["page_id"])
-                file_page["elements"] = {
-                    "image": img_fname,
-                    "img_url": presigned_url,
-                    "img_text": img_ai_desc[:399] if len(img_ai_desc) > 399 else img_ai_desc,
-                    "img_tts_url": img_tts_presigned_url,
-                    "create_img_tts": True,
-                }
-                self.file_metadata["pages"].append(file_page)
-            else:
-                """
-                For Existing Pages, Add More MetaData to a Page
-                """
-                logger.info(f"Updating Page {page_num} image info")
-                page_data["master_doc"] = self.hashed_fname
-                page_data["file_name"] = img_fname
-                page_data["elements"]["image"] = img_fname
-                page_data["elements"]["img_url"] = presigned_url
-                page_data["elements"]["img_text"] = img_ai_desc[:399] if len(img_ai_desc) > 399 else img_ai_desc
-                page_data["elements"]["img_tts_url"] = img_tts_presigned_url
-                page_data["elements"]["create_img_tts"] = True
-
-        #
-        self.file_metadata["tts_ready"] = True
-        logger.info("Booklet Image Extraction succeded")
-        return self.hashed_fname
-
-    def _extract_text_from_file_sync(self, file_data: bytes) -> bool:
-        booklet_file = fitz.open("pdf", file_data)
-        # booklet_file = fitz.open(self.path)
-
-        # Retrieve Text
-        self.file_metadata["number_of_pages"] = len(booklet_file)
-        for page_num, page in enumerate(booklet_file.pages(), start=1):
-            text = page.get_text()
-            text = cleaner.remove_unwanted_text(text)
-
-            # Create TEXT Files from Content
-            label_num = f"{page_num:02}"  # Format page number with leading 0
-
-            # In Memory Version for ECS Support
-            #
-            key = f"{self.hashed_fname}_page_{label_num}"
-
-            if key not in self.text_storage:
-                self.text_storage[key] = ""
-            self.text_storage[key] += text
-
-            # Prepare text data for upload
-            text_data = self.text_storage[key].encode()
-
-            # Upload to S3
-            s3_txt_file_name_key = (
-                f"txt/{self.hashed_fname}/{self.hashed_fname}_page_{label_num}.txt"
-            )
-            self.s3_client.bucket.put_object(
-                Bucket=self.s3_client.bucket_name,
-                Key=s3_txt_file_name_key,
-                Body=text_data,
-            )
+    def _text_node_sync(self, page_num: int, booklet_file, uploads) -> dict:
+        """
+        Text Node: extract and clean the page text, store it and detect
+        its language
+        """
+        with self.doc_lock:
+            raw_text = booklet_file[page_num - 1].get_text()
+        text = cleaner.remove_unwanted_text(raw_text)
+        return self._store_text_sync(page_num, text, uploads)
 
-            # Create Pre-signed URL
-            presigned_url = self.s3_client.generate_presigned_url(
-                s3_txt_file_name_key, expires=os.getenv("URL_EXPIRATION_IN_SECS")
+    def _store_text_sync(self, page_num: int, text: str, uploads) -> dict:
+        """
+        Store the page text in S3 and detect its language
+        """
+        label_num = f"{page_num:02}"  # Format page number with leading 0
+
+        # Upload to S3
+        s3_txt_file_name_key = (
+            f"txt/{self.hashed_fname}/{self.hashed_fname}_page_{label_num}.txt"
+        )
+        uploads.append(
+            self.s3_client.submit_upload(
+                io.BytesIO(text.encode()), s3_txt_file_name_key
             )
+        )
+
+        # Create Pre-signed URL
+        presigned_url = self.s3_client.generate_presigned_url(
+            s3_txt_file_name_key, expires=os.getenv("URL_EXPIRATION_IN_SECS")
+        )
+
+        lang, prob = "", 0
+        if text != "":
+            lang, prob = self.detect_text_language(text)
+
+        return {
+            "text": text,
+            "lang": lang,
+            "lang_accuracy": prob,
+            "txt_file_url": presigned_url,
+        }
+
+    def _text_tts_node_sync(
+        self, page_num: int, text_data: dict, uploads
+    ) -> str | None:
+        """
+        Text TTS Node: synthesize the page text
+        """
+        if text_data["text"] == "":
+            return None
 
-            # Clear stored text
-            del self.text_storage[key]
-
-            # Create TTS File - Polly
-            lang, prob = "", 0
-            if text != "":
-                logger.info(f"Creating TTS File for Page {label_num}")
-                # Send Only Text to Lang Detection and TTS
-                lang, prob = self.detect_text_language(text)
-                tts_dict = {
-                    "tts_text": text.lower(),  # lower case for improve tts accuracy
-                    "doc_id": self.hashed_fname,
-                    "tts_file": f"{self.hashed_fname}_page_{label_num}.mp3",
-                    "language": lang,
-                    "gender": "",
-                }
-
-                tts_audio_stream = self.create_tts_from_text(tts_dict)
-                s3_tts_file_name_key = (
-                    f"tts/{self.hashed_fname}/{self.hashed_fname}_page_{label_num}.mp3"
-                )
+        label_num = f"{page_num:02}"
+        logger.info(f"Creating TTS File for Page {label_num}")
+        tts_dict = {
+            # lower case for improve tts accuracy
+            "tts_text": text_data["text"].lower(),
+            "doc_id": self.hashed_fname,
+            "tts_file": f"{self.hashed_fname}_page_{label_num}.mp3",
+            "language": text_data["lang"],
+            "gender": "",
+        }
+        s3_tts_file_name_key = (
+            f"tts/{self.hashed_fname}/{self.hashed_fname}_page_{label_num}.mp3"
+        )
+        return self._upload_tts(tts_dict, s3_tts_file_name_key, uploads)
+
+    def _render_node_sync(self, page_num: int, booklet_file, uploads) -> dict:
+        """
+        Render Node: rasterize the page straight to PNG with PyMuPDF
+        """
+        label_num = f"{page_num:02}"
+        img_fname = f"{self.hashed_fname}_page_{label_num}.png"
+
+        # Capture Image Data
+        with self.doc_lock:
+            page = booklet_file[page_num - 1]
+            pixmap = page.get_pixmap(dpi=self.img_dpi)
+            img_bytes = io.BytesIO(pixmap.tobytes("png"))
+            page_type = self.classifier.classify(page, pixmap)
+        img_hash = dhash(pixmap_to_gray(pixmap))
+        pixmap = None  # Release the bitmap before the upload
+
+        # Upload to S3
+        s3_img_file_name_key = f"img/{self.hashed_fname}/{img_fname}"
+        img_upload = self.s3_client.submit_upload(img_bytes, s3_img_file_name_key)
+        uploads.append(img_upload)
+
+        # Calculate Presigned URL
+        presigned_url = self.s3_client.generate_presigned_url(
+            s3_img_file_name_key, expires=os.getenv("URL_EXPIRATION_IN_SECS")
+        )
+
+        return {
+            "img_fname": img_fname,
+            "img_url": presigned_url,
+            "img_hash": img_hash,
+            "page_type": page_type,
+            "img_upload": img_upload,
+        }
+
+    def _ai_node_sync(self, img_data: dict, text_lang: str) -> str | None:
+        """
+        AI Node: describe the rendered page in the page language
+        """
+        # AI Image Description. Text only and blank pages are not sent
+        if img_data["page_type"] != PAGE_PICTURE:
+            logger.info(f"AI Description skipped for {img_data['page_type']} page")
+            return None
 
-                # Upload to s3
-                self.s3_client.bucket.upload_fileobj(
-                    tts_audio_stream, self.s3_client.bucket_name, s3_tts_file_name_key
-                )
+        # The AI fetches the page from its presigned URL
+        img_data["img_upload"].result()
 
-                # Calculate Presigned URL
-                tts_presigned_url = self.s3_client.generate_presigned_url(
-                    s3_tts_file_name_key, expires=os.getenv("URL_EXPIRATION_IN_SECS")
-                )
+        img_ai_desc_lang = "es" if text_lang != "en" else "en"
+        logger.info("Sending Image to AI for Description")
+        img_ai_desc = noloai.nolo_ai_description(
+            img_data["img_url"], img_ai_desc_lang, img_hash=img_data["img_hash"]
+        )
+        logger.info("Image Description from AI completed")
+        return img_ai_desc
 
-            else:
-                tts_presigned_url = None
-
-            # Assign Page Metadata
-            # Look for Existing the Page_ID in the Page Index, if not create one
-            page_data = self.get_page_data_dict(page_num)
-            if page_data is None:
-                """
-                For Any New Page Collect MetaData
-                """
-                logger.info(f"Creating Page {page_num} text info")
-                file_page = {}
-                file_page["master_doc"] = self.hashed_fname
-                file_page["page_num"] = page_num
-                file_page["page_id"] = f"pg_{label_num}_{uuid4().hex}"
-                file_page["file_name"] = f"{self.hashed_fname}_page_{label_num}.txt"
-                self.create_page_index_list(page_num, file_page["page_id"])
-                file_page["elements"] = {
-                    "text": text,
-                    "lang": lang,
-                    "lang_accuracy": prob,
-                    "txt_file_url": presigned_url,
-                    "tts_url": tts_presigned_url,
-                    "create_txt_tts": False,
-                }
-                self.file_metadata["pages"].append(file_page)
+    def _img_tts_node_sync(
+        self, page_num: int, img_ai_desc: str | None, uploads
+    ) -> str | None:
+        """
+        Image TTS Node: synthesize the AI description with a female voice
+        """
+        if img_ai_desc is None:
+            return None
 
-            else:
-                """
-                For Existing Pages, just add the text element
-                """
-                logger.info(f"Updating Page {page_num} text info")
-                page_data["master_doc"] = self.hashed_fname
-                page_data["elements"]["text"] = text
-                page_data["elements"]["lang"] = lang
-                page_data["elements"]["lang_accuracy"] = prob
-                page_data["elements"]["txt_file_url"] = presigned_url
-                page_data["elements"]["tts_url"] = tts_presigned_url
-                page_data["elements"]["create_txt_tts"] = False
-
-        logger.info(f"Text Extraction sucedded booklet id {self.hashed_fname}")
-        return self.hashed_fname
+        label_num = f"{page_num:02}"
+        tts_text = img_ai_desc[:399]
+        logger.info(f"Creating IMG TTS File for Page {label_num}")
+        # Send Only Text to Lang Detection and TTS
+        lang, prob = self.detect_text_language(img_ai_desc)
+        tts_dict = {
+            "tts_text": tts_text.lower(),  # lower case for improve tts accuracy
+            "doc_id": self.hashed_fname,
+            "tts_file": f"{self.hashed_fname}_img_desc_page_{label_num}.mp3",
+            "language": lang,
+            "gender": "female",
+        }
+        s3_tts_file_name_key = (
+            f"tts/{self.hashed_fname}/{self.hashed_fname}_img_desc_page_{label_num}.mp3"
+        )
+        return self._upload_tts(tts_dict, s3_tts_file_name_key, uploads)
+
+    def _set_page_metadata(
+        self,
+        page_num: int,
+        text_data: dict,
+        tts_url: str | None,
+        img_data: dict,
+        img_ai_desc: str | None,
+        img_tts_url: str | None,
+    ):
+        """
+        Collect the node results into the page metadata
+        """
+        label_num = f"{page_num:02}"
+        file_page = {}
+        file_page["master_doc"] = self.hashed_fname
+        file_page["page_num"] = page_num
+        file_page["page_id"] = f"pg_{label_num}_{uuid4().hex}"
+        file_page["file_name"] = img_data["img_fname"]
+        file_page["elements"] = {
+            "text": text_data["text"],
+            "lang": text_data["lang"],
+            "lang_accuracy": text_data["lang_accuracy"],
+            "txt_file_url": text_data["txt_file_url"],
+            "tts_url": tts_url,
+            "create_txt_tts": False,
+            "image": img_data["img_fname"],
+            "img_url": img_data["img_url"],
+            "img_text": img_ai_desc[:399] if img_ai_desc else img_ai_desc,
+            "img_tts_url": img_tts_url,
+            "create_img_tts": True,
+        }
+        self.create_page_index_list(page_num, file_page["page_id"])
+        self.file_metadata["pages"][page_num - 1] = file_page
+
+        # cover page
+        if page_num == 1:
+            self.file_metadata["cover_img"] = img_data["img_url"]
@@ -1,14 +1,195 @@
+import os
+import math
 import time
+import threading
 from fastapi import Request, HTTPException
 import logging
 
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Optional shared backend
+    aioredis = None
+
 
 # Create Logger
 logger = logging.getLogger(__name__)
 
+# Rate Limit Settings
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+RATE_LIMIT_REDIS_TIMEOUT_IN_SECS = float(
+    os.getenv("RATE_LIMIT_REDIS_TIMEOUT_IN_SECS", "0.25")
+)
+RATE_LIMIT_REDIS_RETRY_IN_SECS = int(os.getenv("RATE_LIMIT_REDIS_RETRY_IN_SECS", "30"))
+RATE_LIMIT_KEY_PREFIX = "nolo:ral:"
+WHEEL_SLOTS = 512  # one slot per second, longer TTLs take extra laps
+
+# Sliding window counter, same algorithm as NoloMemoryRateLimitStore.hit
+SLIDING_WINDOW_LUA = """
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local penalty = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'start', 'prev', 'curr', 'blocked')
+local start = tonumber(state[1]) or 0
+local prev = tonumber(state[2]) or 0
+local curr = tonumber(state[3]) or 0
+local blocked = tonumber(state[4]) or 0
+if blocked > now then
+  return 0
+end
+local window_start = math.floor(now / window) * window
+if window_start ~= start then
+  if window_start - start == window then prev = curr else prev = 0 end
+  curr = 0
+  start = window_start
+end
+local allowed = 1
+if prev * (window - (now - window_start)) / window + curr >= limit then
+  blocked = now + penalty
+  allowed = 0
+else
+  curr = curr + 1
+end
+redis.call('HSET', KEYS[1], 'start', start, 'prev', prev, 'curr', curr, 'blocked', blocked)
+redis.call('EXPIRE', KEYS[1], math.ceil(2 * window + penalty))
+return allowed
+"""
+
+
+class NoloMemoryRateLimitStore:
+    """
+    In process sliding window counters. Idle keys expire through a
+    timing wheel, so a request only touches its own key and the slots
+    elapsed since the last one
+    """
+
+    def __init__(self, wheel_slots=WHEEL_SLOTS):
+        self.counters = {}
+        self.wheel = [set() for _ in range(wheel_slots)]
+        self.last_tick = int(time.time())
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.counters)
+
+    def _schedule(self, key, expires_at: float):
+        self.wheel[math.ceil(expires_at) % len(self.wheel)].add(key)
 
-# In Memory Counter
-request_counters = {}
+    def _advance(self, now: float):
+        """
+        Expire the keys of every slot between the last tick and now
+        """
+        tick = int(now)
+        if tick <= self.last_tick:
+            return
+        first_tick = max(self.last_tick + 1, tick - len(self.wheel) + 1)
+        for current in range(first_tick, tick + 1):
+            slot = self.wheel[current % len(self.wheel)]
+            for key in list(slot):
+                slot.discard(key)
+                counter = self.counters.get(key)
+                if counter is None:
+                    continue
+                if counter[4] <= now:
+                    del self.counters[key]
+                else:
+                    # Touched since it was scheduled, or a longer lap
+                    self._schedule(key, counter[4])
+        self.last_tick = tick
+
+    async def hit(self, key: str, window: int, limit: int, penalty: int) -> bool:
+        return self.hit_sync(key, window, limit, penalty, time.time())
+
+    def hit_sync(self, key, window, limit, penalty, now) -> bool:
+        """
+        Count one request for key, False when it is over the limit. The
+        previous fixed window is weighted by its overlap with the sliding
+        one, going over the limit blocks the key for penalty seconds
+        """
+        with self.lock:
+            self._advance(now)
+            # [window start, previous count, current count, blocked until, expires at]
+            counter = self.counters.get(key)
+            if counter is None:
+                counter = self.counters[key] = [0, 0, 0, 0.0, 0.0]
+                scheduled = False
+            else:
+                scheduled = True
+
+            if counter[3] > now:
+                return False
+
+            window_start = (now // window) * window
+            if window_start != counter[0]:
+                counter[1] = counter[2] if window_start - counter[0] == window else 0
+                counter[2] = 0
+                counter[0] = window_start
+
+            allowed = True
+            estimated = counter[1] * (window - (now - window_start)) / window
+            if estimated + counter[2] >= limit:
+                counter[3] = now + penalty
+                allowed = False
+            else:
+                counter[2] += 1
+
+            # Expiry only moves forward, the wheel reschedules lazily
+            counter[4] = now + 2 * window + penalty
+            if not scheduled:
+                self._schedule(key, counter[4])
+            return allowed
+
+
+class NoloRedisRateLimitStore:
+    """
+    Shared counters on a Redis protocol server, one Lua call per request
+    so every API worker sees the same limits. A failed call switches to
+    the in process counters for RATE_LIMIT_REDIS_RETRY_IN_SECS, so an
+    unreachable server costs one short timeout per period, not per request
+    """
+
+    def __init__(self, redis_url: str, fallback=None, client=None):
+        self.client = client or aioredis.from_url(
+            redis_url,
+            socket_connect_timeout=RATE_LIMIT_REDIS_TIMEOUT_IN_SECS,
+            socket_timeout=RATE_LIMIT_REDIS_TIMEOUT_IN_SECS,
+        )
+        self.script = self.client.register_script(SLIDING_WINDOW_LUA)
+        self.fallback = fallback or NoloMemoryRateLimitStore()
+        self.retry_at = 0.0
+
+    async def hit(self, key: str, window: int, limit: int, penalty: int) -> bool:
+        if time.monotonic() < self.retry_at:
+            return await self.fallback.hit(key, window, limit, penalty)
+        try:
+            allowed = await self.script(
+                keys=[RATE_LIMIT_KEY_PREFIX + key], args=[window, limit, penalty]
+            )
+            return bool(allowed)
+        except Exception as e:
+            self.retry_at = time.monotonic() + RATE_LIMIT_REDIS_RETRY_IN_SECS
+            logger.warning(
+                f"Rate Limit store unavailable, using memory for "
+                f"{RATE_LIMIT_REDIS_RETRY_IN_SECS}s. REASON: {e}"
+            )
+            return await self.fallback.hit(key, window, limit, penalty)
+
+
+def get_rate_limit_store():
+    """
+    Shared store when RATE_LIMIT_REDIS_URL is set, in process otherwise
+    """
+    if RATE_LIMIT_REDIS_URL:
+        if aioredis is not None:
+            logger.info("Rate Limit counters shared on Redis")
+            return NoloRedisRateLimitStore(RATE_LIMIT_REDIS_URL)
+        logger.warning("RATE_LIMIT_REDIS_URL is set but redis is not installed")
+    return NoloMemoryRateLimitStore()
+
+
+# Rate Limit Counters shared by every limiter of the process
+rate_limit_store = get_rate_limit_store()
 
 
 class NoloRateLimit:
@@ -17,47 +198,30 @@ class NoloRateLimit:
     """
 
     def __init__(
-        self, requests_limit: int, time_window: int, penalty_time_in_secs: int
+        self,
+        requests_limit: int,
+        time_window: int,
+        penalty_time_in_secs: int,
+        store=None,
     ):
         self.__str__ = "Rate Limiter for API Calls"
         self.requests_limit = requests_limit
         self.time_window = time_window
         self.penalty_time = penalty_time_in_secs
+        self.store = store or rate_limit_store
 
     async def __call__(self, request: Request):
-        client_ip = request.client.host
+        client_ip = request.client.host if request.client else "unknown"
         route_path = request.url.path
 
-        # Get the current timestamp
-        current_time = int(time.time())
-
         # Create a unique key based on client IP and route path
         key = f"{client_ip}:{route_path}"
 
-        # Check if client's request counter exists
-        if key not in request_counters:
-            request_counters[key] = {"timestamp": current_time, "count": 1}
-        else:
-            # Check if the time window has elapsed, reset the counter if needed
-            if current_time - request_counters[key]["timestamp"] > (
-                self.time_window + self.penalty_time
-            ):
-                # Reset the counter and update the timestamp
-                request_counters[key]["timestamp"] = current_time
-                request_counters[key]["count"] = 1
-            else:
-                # Check if the client has exceeded the request limit
-                if request_counters[key]["count"] >= self.requests_limit:
-                    logger.warning(f"Too Many Attemps from {client_ip}")
-                    raise HTTPException(status_code=429, detail="Too Many Requests")
-                else:
-                    request_counters[key]["count"] += 1
-
-        # Clean up expired client data (optional)
-        for k in list(request_counters.keys()):
-            if current_time - request_counters[k]["timestamp"] > (
-                self.time_window + self.penalty_time
-            ):
-                request_counters.pop(k)
+        allowed = await self.store.hit(
+            key, self.time_window, self.requests_limit, self.penalty_time
+        )
+        if not allowed:
+            logger.warning(f"Too Many Attemps from {client_ip}")
+            raise HTTPException(status_code=429, detail="Too Many Requests")
 
         return True
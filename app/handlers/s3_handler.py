@@ -1,23 +1,161 @@
-import boto3
+import hashlib
+import hmac
 import logging
 import os
-from botocore.client import Config
+import threading
+from urllib.parse import quote, unquote, urlsplit, urlunsplit
+from concurrent.futures import Future, ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
 from botocore.exceptions import ClientError
-from settings.nolo_config import NoloCFG
+from s3transfer.subscribers import BaseSubscriber
+from utils.lru_cache import NoloLRUCache
+from utils.io_pool import io_pool
+from handlers.aws_handler import aws_clients
 
 
 # Create Logger
 logger = logging.getLogger(__name__)
 
-# Load Config
-cfg = NoloCFG()
+# URL Settings
+URL_EXPIRATION_IN_SECS = os.getenv("URL_EXPIRATION_IN_SECS")
 
+# Presign Cache Settings
+DEFAULT_URL_EXPIRATION_IN_SECS = 3600  # boto3 default
+PRESIGN_CACHE_MAX_ENTRIES = int(os.getenv("PRESIGN_CACHE_MAX_ENTRIES", "10000"))
+PRESIGN_CACHE_TTL_RATIO = float(os.getenv("PRESIGN_CACHE_TTL_RATIO", "0.5"))
+
+# Shared Presigned URL Cache, keyed by (bucket, key, method, expiration)
+presign_cache = NoloLRUCache(PRESIGN_CACHE_MAX_ENTRIES)
+
+# Transfer Settings
+S3_MAX_CONCURRENT_TRANSFERS = int(os.getenv("S3_MAX_CONCURRENT_TRANSFERS", "20"))
+
+# Delete Settings
+S3_DELETE_BATCH_SIZE = 1000  # delete_objects limit
+S3_MAX_DELETE_WORKERS = int(os.getenv("S3_MAX_DELETE_WORKERS", "8"))
+BOOKLET_ASSET_PREFIXES = ["img", "txt", "tts"]
+
+# Shared pool for delete_objects batches
+delete_pool = ThreadPoolExecutor(max_workers=S3_MAX_DELETE_WORKERS)
+
+# Shared Transfer Manager, every upload of the process goes through it
+transfer_manager = None
+transfer_manager_lock = threading.Lock()
 
-# Global AWS IDs
-AWS_ACCESS_KEY_ID = cfg.aws_access_key_id
-AWS_SECRET_ACCESS_KEY = cfg.aws_secret_access_key_id
-REGION_NAME = cfg.aws_default_region
-URL_EXPIRATION_IN_SECS = os.getenv("URL_EXPIRATION_IN_SECS")
+
+def get_transfer_manager():
+    """
+    Shared Transfer Manager, built on the first upload
+    """
+    global transfer_manager
+    with transfer_manager_lock:
+        if transfer_manager is None:
+            transfer_manager = create_transfer_manager(
+                aws_clients.client("s3"),
+                TransferConfig(max_concurrency=S3_MAX_CONCURRENT_TRANSFERS),
+            )
+        return transfer_manager
+
+
+def presign_ttl(expires=URL_EXPIRATION_IN_SECS) -> float:
+    """
+    How long a URL signed for expires seconds can be served from a cache
+    """
+    return int(expires or DEFAULT_URL_EXPIRATION_IN_SECS) * PRESIGN_CACHE_TTL_RATIO
+
+
+def presign_min_validity(expires=URL_EXPIRATION_IN_SECS) -> float:
+    """
+    Validity left, at least, on a URL taken from the presign cache
+    """
+    return int(expires or DEFAULT_URL_EXPIRATION_IN_SECS) * (
+        1 - PRESIGN_CACHE_TTL_RATIO
+    )
+
+
+def _hmac_sha256(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode(), hashlib.sha256).digest()
+
+
+class NoloBulkPresigner:
+    """
+    SigV4 query signer for many GET URLs. It reuses the host, date, scope
+    and query of a boto3 signed template URL, so the signing key is
+    derived once per batch. Only the object path changes between URLs
+    """
+
+    def __init__(self, template_url: str, template_filename: str, secret_key: str):
+        parts = urlsplit(template_url)
+        params = [tuple(pair.split("=", 1)) for pair in parts.query.split("&")]
+        self.signature = dict(params)["X-Amz-Signature"]
+        credential = unquote(dict(params)["X-Amz-Credential"])
+        _, date_stamp, region, service, _ = credential.split("/")
+        amz_date = dict(params)["X-Amz-Date"]
+
+        encoded_filename = quote(template_filename, safe="/~")
+        if not parts.path.endswith(encoded_filename):
+            raise ValueError(f"Unexpected presigned path {parts.path}")
+
+        self.parts = parts
+        self.path_prefix = parts.path[: -len(encoded_filename)]
+        params = [pair for pair in params if pair[0] != "X-Amz-Signature"]
+        self.url_query = "&".join(f"{k}={v}" for k, v in params)
+        self.canonical_query = "&".join(f"{k}={v}" for k, v in sorted(params))
+        self.scope_header = (
+            f"AWS4-HMAC-SHA256\n{amz_date}\n"
+            f"{date_stamp}/{region}/{service}/aws4_request\n"
+        )
+        signing_key = _hmac_sha256(f"AWS4{secret_key}".encode(), date_stamp)
+        for msg in (region, service, "aws4_request"):
+            signing_key = _hmac_sha256(signing_key, msg)
+        self.signing_key = signing_key
+
+    def sign_path(self, path: str) -> str:
+        canonical_request = "\n".join(
+            [
+                "GET",
+                path,
+                self.canonical_query,
+                f"host:{self.parts.netloc}\n",
+                "host",
+                "UNSIGNED-PAYLOAD",
+            ]
+        )
+        string_to_sign = (
+            self.scope_header + hashlib.sha256(canonical_request.encode()).hexdigest()
+        )
+        return hmac.new(
+            self.signing_key, string_to_sign.encode(), hashlib.sha256
+        ).hexdigest()
+
+    def is_valid(self) -> bool:
+        """
+        Self check, the template must sign to the boto3 signature
+        """
+        return hmac.compare_digest(self.sign_path(self.parts.path), self.signature)
+
+    def presign(self, filename: str) -> str:
+        path = self.path_prefix + quote(filename, safe="/~")
+        query = f"{self.url_query}&X-Amz-Signature={self.sign_path(path)}"
+        return urlunsplit(
+            (self.parts.scheme, self.parts.netloc, path, query, self.parts.fragment)
+        )
+
+
+class NoloUploadSubscriber(BaseSubscriber):
+    """
+    Resolve a standard Future when the S3 transfer is done
+    """
+
+    def __init__(self, done_future: Future):
+        self.done_future = done_future
+
+    def on_done(self, future, **kwargs):
+        try:
+            future.result()
+            self.done_future.set_result(True)
+        except Exception as e:
+            self.done_future.set_exception(e)
 
 
 class NoloBlobAPI:
@@ -27,21 +165,123 @@ class NoloBlobAPI:
 
     def __init__(self, bucket_name=None):
         self.bucket_name = bucket_name or os.getenv("BUCKET_NAME")
-        self.bucket = boto3.client(
-            "s3",
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=REGION_NAME,
-            config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
-        )
         logging.info("NoloBlob Object Created")
 
+    @property
+    def bucket(self):
+        return aws_clients.client("s3")
+
     def generate_presigned_url(self, filename, expires=URL_EXPIRATION_IN_SECS):
-        return self.bucket.generate_presigned_url(
+        """
+        Presigned GET URL. A signed URL is reused while at least
+        (1 - PRESIGN_CACHE_TTL_RATIO) of its lifetime is left
+        """
+        expires = int(expires or DEFAULT_URL_EXPIRATION_IN_SECS)
+        cache_key = (self.bucket_name, filename, "get_object", expires)
+        url = presign_cache.get(cache_key)
+        if url is not None:
+            return url
+
+        url = self.bucket.generate_presigned_url(
             ClientMethod="get_object",
             ExpiresIn=expires,
             Params={"Bucket": self.bucket_name, "Key": filename},
         )
+        presign_cache.put(cache_key, url, ttl_in_secs=presign_ttl(expires))
+        return url
+
+    def presign_many(self, filenames, expires=URL_EXPIRATION_IN_SECS) -> dict:
+        """
+        Presigned GET URLs for many keys, as a {filename: url} dict.
+        Cache misses are signed in one batch from a single boto3 template,
+        falling back to boto3 when the template does not check out
+        """
+        expires = int(expires or DEFAULT_URL_EXPIRATION_IN_SECS)
+        urls = {}
+        missing = []
+        for filename in dict.fromkeys(filenames):
+            url = presign_cache.get((self.bucket_name, filename, "get_object", expires))
+            if url is None:
+                missing.append(filename)
+            else:
+                urls[filename] = url
+
+        if not missing:
+            return urls
+
+        template_url = self.bucket.generate_presigned_url(
+            ClientMethod="get_object",
+            ExpiresIn=expires,
+            Params={"Bucket": self.bucket_name, "Key": missing[0]},
+        )
+        signed = {missing[0]: template_url}
+        presigner = self._bulk_presigner(template_url, missing[0])
+        for filename in missing[1:]:
+            if presigner is not None:
+                signed[filename] = presigner.presign(filename)
+            else:
+                signed[filename] = self.bucket.generate_presigned_url(
+                    ClientMethod="get_object",
+                    ExpiresIn=expires,
+                    Params={"Bucket": self.bucket_name, "Key": filename},
+                )
+
+        for filename, url in signed.items():
+            presign_cache.put(
+                (self.bucket_name, filename, "get_object", expires),
+                url,
+                ttl_in_secs=presign_ttl(expires),
+            )
+        urls.update(signed)
+        return urls
+
+    def set_cover_urls(self, items: list) -> list:
+        """
+        Presigned URL for the Cover of every booklet in items
+        """
+        cover_keys = [
+            f"img/{item['doc_id']}/{item['doc_id']}_page_01.png" for item in items
+        ]
+        cover_urls = self.presign_many(cover_keys)
+        for item, img_file_key in zip(items, cover_keys):
+            item["cover_img"] = cover_urls[img_file_key]
+        return items
+
+    def set_page_urls(self, pages: list) -> list:
+        """
+        Presigned URLs for the image, text and audio of every page
+        """
+        page_keys = []
+        for page in pages:
+            page_name = page["file_name"]
+            hashed_name = page["master_doc"]
+            img_tts_file = page_name[:8] + "_img_desc" + page_name[8:-4] + ".mp3"
+            page_keys.append(
+                {
+                    "img_url": f"img/{hashed_name}/{page_name}",
+                    "tts_url": f"tts/{hashed_name}/{page_name[:-4]}.mp3",
+                    "txt_file_url": f"txt/{hashed_name}/{page_name[:-4]}.txt",
+                    "img_tts_url": f"tts/{hashed_name}/{img_tts_file}",
+                }
+            )
+
+        urls = self.presign_many(key for keys in page_keys for key in keys.values())
+        for page, keys in zip(pages, page_keys):
+            for element, file_key in keys.items():
+                page["elements"][element] = urls[file_key]
+        return pages
+
+    def _bulk_presigner(self, template_url, template_filename):
+        try:
+            credentials = self.bucket._request_signer._credentials
+            secret_key = credentials.get_frozen_credentials().secret_key
+            presigner = NoloBulkPresigner(template_url, template_filename, secret_key)
+            if presigner.is_valid():
+                return presigner
+            logger.warning("Bulk presigner self check failed, using boto3")
+        except Exception as e:
+            logger.warning(f"Bulk presigner unavailable, using boto3. REASON: {e}")
+        return None
 
     def generate_presigned_post_fields(
         self, path_prefix="", expires=URL_EXPIRATION_IN_SECS
@@ -81,6 +321,42 @@ class NoloBlobAPI:
             logger.error(e)
             return False
 
+    def object_exists(self, filename) -> bool:
+        try:
+            self.bucket.head_object(Bucket=self.bucket_name, Key=filename)
+            return True
+        except ClientError:
+            return False
+
+    def copy_object(self, source_filename, filename) -> bool:
+        """
+        Server side copy between two keys of the bucket
+        """
+        try:
+            self.bucket.copy_object(
+                Bucket=self.bucket_name,
+                Key=filename,
+                CopySource={"Bucket": self.bucket_name, "Key": source_filename},
+            )
+            return True
+        except ClientError as e:
+            logger.warning(f"Copy from {source_filename} failed. REASON: {e}")
+            return False
+
+    def submit_upload(self, fileobj, filename) -> Future:
+        """
+        Queue an upload on the shared transfer manager and return a
+        Future resolved once the object is stored
+        """
+        done_future = Future()
+        get_transfer_manager().upload(
+            fileobj,
+            self.bucket_name,
+            filename,
+            subscribers=[NoloUploadSubscriber(done_future)],
+        )
+        return done_future
+
     def get_one_object(self, filename):
         try:
             response = self.bucket.get_object(Bucket=self.bucket_name, Key=filename)
@@ -96,28 +372,67 @@ class NoloBlobAPI:
         This function deletes all files in a folder from S3 bucket
         :return: True/False
         """
+        return self.delete_prefixes([prefix])
 
-        try:
-            # First we list all files in folder
-            response = self.bucket.list_objects_v2(
-                Bucket=self.bucket_name, Prefix=prefix
-            )
-
-            files_in_folder = response["Contents"]
-            files_to_delete = []
-            # We will create Key array to pass to delete_objects function
-            for f in files_in_folder:
-                files_to_delete.append({"Key": f["Key"]})
+    def delete_prefixes(self, prefixes: list) -> bool:
+        """
+        Delete every object under the prefixes. Listings are paginated
+        per prefix in parallel and each page of up to 1000 keys is deleted
+        as one batch on the shared delete pool
+        :return: True/False
+        """
 
-            # This will delete all files in a folder
-            response = self.bucket.delete_objects(
-                Bucket=self.bucket_name, Delete={"Objects": files_to_delete}
+        def list_and_delete(prefix):
+            paginator = self.bucket.get_paginator("list_objects_v2")
+            batches = []
+            pages = paginator.paginate(
+                Bucket=self.bucket_name,
+                Prefix=prefix,
+                PaginationConfig={"PageSize": S3_DELETE_BATCH_SIZE},
             )
+            for page in pages:
+                keys = [{"Key": f["Key"]} for f in page.get("Contents", [])]
+                if keys:
+                    batches.append(delete_pool.submit(self._delete_batch, keys))
+            return batches
 
-            logger.info("Bucket content deleted succesfully!")
-
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, len(prefixes))) as listers:
+                listings = list(listers.map(list_and_delete, prefixes))
+            results = [batch.result() for batches in listings for batch in batches]
+            logger.info(f"Bucket content deleted for {prefixes}: {sum(results)} files")
             return True
 
         except ClientError as e:
             logger.error(e)
             return False
+
+    def _delete_batch(self, keys: list) -> int:
+        response = self.bucket.delete_objects(
+            Bucket=self.bucket_name, Delete={"Objects": keys, "Quiet": True}
+        )
+        errors = response.get("Errors", [])
+        if errors:
+            raise ClientError(
+                {"Error": {"Code": errors[0]["Code"], "Message": errors[0]["Message"]}},
+                "DeleteObjects",
+            )
+        return len(keys)
+
+    def delete_booklet_assets(self, doc_id: str) -> bool:
+        """
+        Delete the images, text and audio of a booklet
+        """
+        return self.delete_prefixes(
+            [f"{prefix}/{doc_id}/" for prefix in BOOKLET_ASSET_PREFIXES]
+        )
+
+    # Async API, the blocking boto3 calls run on the shared I/O pool
+    async def async_delete_booklet_assets(self, doc_id: str) -> bool:
+        return await io_pool.run(self.delete_booklet_assets, doc_id)
+
+    async def async_delete_file(self, filename):
+        return await io_pool.run(self.delete_file, filename)
+
+    async def async_object_exists(self, filename) -> bool:
+        return await io_pool.run(self.object_exists, filename)
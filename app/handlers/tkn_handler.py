@@ -1,7 +1,13 @@
 """
 Identity and Access Manager
 """
+import asyncio
+import threading
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
+from fastapi import HTTPException, status
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 import os
@@ -11,19 +17,90 @@ import logging
 # Create Logger
 logger = logging.getLogger(__name__)
 
+# Password Hashing Pool Settings
+BCRYPT_MAX_WORKERS = int(os.getenv("BCRYPT_MAX_WORKERS", "2"))
+BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", "32"))
+BCRYPT_RETRY_AFTER_IN_SECS = "1"
+BCRYPT_START_METHOD = os.getenv("BCRYPT_START_METHOD", "forkserver")
+
+# Started with the API, bcrypt runs off the event loop process
+hash_pool = None
+hash_pool_lock = threading.Lock()
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _verify_password(plain_pwd: str, hashed_pwd: str) -> bool:
+    return pwd_context.verify(plain_pwd, hashed_pwd)
+
+
+def _get_password_hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _noop():
+    return None
+
+
+def start_hash_pool() -> ProcessPoolExecutor:
+    """
+    Workers come from a forkserver, never a fork of the threaded API
+    process, and are all started before the first login
+    """
+    global hash_pool
+    with hash_pool_lock:
+        if hash_pool is None:
+            hash_pool = ProcessPoolExecutor(
+                max_workers=BCRYPT_MAX_WORKERS,
+                mp_context=get_context(BCRYPT_START_METHOD),
+            )
+            for future in [hash_pool.submit(_noop) for _ in range(BCRYPT_MAX_WORKERS)]:
+                future.result()
+            logger.info(
+                f"Password Hashing Pool started with {BCRYPT_MAX_WORKERS} workers"
+            )
+        return hash_pool
+
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    return hash_pool or start_hash_pool()
+
+
+def restart_hash_pool(broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+    """
+    Replace a pool that lost a worker, callers racing here rebuild it once
+    """
+    global hash_pool
+    with hash_pool_lock:
+        if hash_pool is broken:
+            logger.warning("Password Hashing Pool broken, restarting it")
+            hash_pool = None
+            broken.shutdown(wait=False, cancel_futures=True)
+    return start_hash_pool()
+
+
+def stop_hash_pool():
+    global hash_pool
+    with hash_pool_lock:
+        if hash_pool is not None:
+            hash_pool.shutdown(wait=True, cancel_futures=True)
+            hash_pool = None
+
 
 class NoloToken:
     """
     Token Manager
     """
 
+    # bcrypt calls in flight across every NoloToken of the process
+    hash_inflight = 0
+
     def __init__(self):
         self.secret_key = os.getenv("JWT_SECRET_KEY")
         self.refresh_key = os.getenv("JWT_REFRESH_SECRET_KEY")
         self.algorithm = os.getenv("JWT_ALGORITHM")
         self.token_expires = int(os.getenv("JWT_TOKEN_EXPIRES_MIN"))
         self.token_refresh = int(os.getenv("JWT_TOKEN_REFRESH_MIN"))
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self.pwd_context = pwd_context
         logger.info("Token Backend Object in Use")
 
     def verify_password(self, plain_pwd: str, hashed_pwd: str) -> bool:
@@ -32,6 +109,44 @@ class NoloToken:
     def get_password_hash(self, password: str) -> str:
         return self.pwd_context.hash(password)
 
+    async def _run_in_hash_pool(self, func, *args):
+        """
+        Run a bcrypt call in the process pool. Past BCRYPT_MAX_QUEUE
+        calls in flight, fail fast with a 503 instead of queueing. A call
+        that finds the pool broken restarts it and runs once more
+        """
+        busy_exception = HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, try again",
+            headers={"Retry-After": BCRYPT_RETRY_AFTER_IN_SECS},
+        )
+
+        if NoloToken.hash_inflight >= BCRYPT_MAX_QUEUE:
+            logger.warning("Password Hashing Pool saturated")
+            raise busy_exception
+
+        NoloToken.hash_inflight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            pool = get_hash_pool()
+            try:
+                return await loop.run_in_executor(pool, func, *args)
+            except BrokenProcessPool:
+                pool = await asyncio.to_thread(restart_hash_pool, pool)
+            try:
+                return await loop.run_in_executor(pool, func, *args)
+            except BrokenProcessPool:
+                logger.error("Password Hashing Pool broken again after a restart")
+                raise busy_exception
+        finally:
+            NoloToken.hash_inflight -= 1
+
+    async def async_verify_password(self, plain_pwd: str, hashed_pwd: str) -> bool:
+        return await self._run_in_hash_pool(_verify_password, plain_pwd, hashed_pwd)
+
+    async def async_get_password_hash(self, password: str) -> str:
+        return await self._run_in_hash_pool(_get_password_hash, password)
+
     def create_access_token(
         self, data: dict, expires_delta: timedelta | None = None
     ) -> str:
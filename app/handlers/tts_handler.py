@@ -1,40 +1,125 @@
 import os
 import logging
 import io
-import boto3
-from settings.nolo_config import NoloCFG
+import re
+import time
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from utils.lru_cache import NoloLRUCache
+from handlers.aws_handler import aws_clients
 
 
 # Create Logger
 logger = logging.getLogger(__name__)
 
-# Load ENV data
-cfg = NoloCFG()
+# Polly Settings
+TTS_ENGINE = "standard"
+TTS_OUTPUT_FORMAT = "mp3"
+TTS_CACHE_MAX_ENTRIES = int(os.getenv("TTS_CACHE_MAX_ENTRIES", "5000"))
+# Immutable audio objects shared by every booklet, never overwritten
+TTS_CACHE_PREFIX = "tts/_cache"
+TTS_MAX_CHARS = int(os.getenv("TTS_MAX_CHARS", "2800"))  # Polly limit is 3000
+TTS_MAX_CHUNKS_PER_VOICE = int(os.getenv("TTS_MAX_CHUNKS_PER_VOICE", "4"))
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;:])\s+")
 
-# Load AWS Data
-# AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-# AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-# REGION_NAME = os.getenv("AWS_DEFAULT_REGION")
+# Chunk Synthesis Workers, bounded per voice
+chunk_pool = ThreadPoolExecutor(max_workers=TTS_MAX_CHUNKS_PER_VOICE * 2)
+voice_slots = {}
+voice_slots_lock = threading.Lock()
 
-AWS_ACCESS_KEY_ID = cfg.aws_access_key_id
-AWS_SECRET_ACCESS_KEY = cfg.aws_secret_access_key_id
-REGION_NAME = cfg.aws_default_region
 
-client = boto3.client(
-    "polly",
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=REGION_NAME,
-)
+def get_voice_slot(voice_id: str) -> threading.BoundedSemaphore:
+    with voice_slots_lock:
+        if voice_id not in voice_slots:
+            voice_slots[voice_id] = threading.BoundedSemaphore(TTS_MAX_CHUNKS_PER_VOICE)
+        return voice_slots[voice_id]
+
+
+def split_text_for_tts(text: str, max_chars: int = TTS_MAX_CHARS) -> list:
+    """
+    Split text at sentence boundaries into chunks under max_chars.
+    Sentences longer than max_chars are cut at the last space
+    """
+    chunks = []
+    current = ""
+    for sentence in SENTENCE_BOUNDARY.split(text.strip()):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+
+    if current:
+        chunks.append(current)
+    return [chunk for chunk in chunks if chunk]
+
+
+def get_voice_id(gender: str) -> str:
+    return "Penelope" if gender == "female" else "Miguel"
+
+
+def tts_cache_key(
+    text: str, voice_id: str, engine=TTS_ENGINE, output_format=TTS_OUTPUT_FORMAT
+) -> str:
+    """
+    Content address of a synthesis: normalised text, voice, engine and format
+    """
+    normalised_text = " ".join(text.lower().split())
+    content = "|".join([normalised_text, voice_id, engine, output_format])
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def tts_cache_object_key(digest: str) -> str:
+    return f"{TTS_CACHE_PREFIX}/{digest}.{TTS_OUTPUT_FORMAT}"
+
+
+class NoloTTSCache:
+    """
+    Index of the TTS cache objects known to be fully stored in S3,
+    keyed by content address
+    """
+
+    def __init__(self, max_entries=None):
+        self.index = NoloLRUCache(max_entries or TTS_CACHE_MAX_ENTRIES)
+
+    def get(self, digest: str) -> str | None:
+        return self.index.get(digest)
+
+    def put(self, digest: str, s3_key: str):
+        self.index.put(digest, s3_key)
+
+    def evict(self, digest: str):
+        self.index.pop(digest)
+
+    def stats(self) -> dict:
+        return self.index.stats()
+
+
+# Shared by every NoloTTS in the process
+tts_cache = NoloTTSCache()
 
 
 class NoloTTS:
-    def __init__(self, audio_path=None, lang=None, prob=None):
+    def __init__(self, audio_path=None, lang=None, prob=None, cache=None):
         self.audio_path = f"{audio_path or os.getenv('OUT_TTS_PATH')}"
         self.ouput_exists = False
         self.lang = lang or "es"
         self.accuracy = prob or 0
-        self.client = client
+        self.cache = cache or tts_cache
+
+    @property
+    def client(self):
+        return aws_clients.client("polly")
 
     def create_dir(self, doc_id: str) -> bool:
         try:
@@ -45,21 +130,95 @@ class NoloTTS:
             print(e)
             return False
 
-    def convert_to_tts(self, new_tts_file: dict) -> bool:
+    def _synthesize_chunk(self, chunk_num: int, tts_text: str, voice_id: str) -> tuple:
         """
-        Convert text to audio in Memory
+        Call Polly for one chunk, return its audio and timing
+        """
+        with get_voice_slot(voice_id):
+            started = time.perf_counter()
+            response = self.client.synthesize_speech(
+                VoiceId=voice_id,
+                OutputFormat=TTS_OUTPUT_FORMAT,
+                Text=tts_text,
+                Engine=TTS_ENGINE,
+            )
+            audio = response["AudioStream"].read()
+            elapsed = time.perf_counter() - started
+
+        timing = {"chunk": chunk_num, "chars": len(tts_text), "secs": round(elapsed, 3)}
+        return audio, timing
+
+    def synthesize_chunked(self, tts_text: str, voice_id: str) -> tuple:
+        """
+        Synthesize long text as concurrent sentence chunks and join the MP3
+        frames in order. Return the audio in Memory and the chunk timings
         """
+        chunks = split_text_for_tts(tts_text)
+        if len(chunks) <= 1:
+            results = [self._synthesize_chunk(1, tts_text, voice_id)]
+        else:
+            futures = [
+                chunk_pool.submit(self._synthesize_chunk, chunk_num, chunk, voice_id)
+                for chunk_num, chunk in enumerate(chunks, start=1)
+            ]
+            results = [future.result() for future in futures]
 
-        VoiceId = "Penelope" if new_tts_file["gender"] == "female" else "Miguel"
+        audio_stream = io.BytesIO(b"".join(audio for audio, _ in results))
+        return audio_stream, [timing for _, timing in results]
 
-        response = client.synthesize_speech(
-            VoiceId=VoiceId,
-            OutputFormat="mp3",
-            Text=new_tts_file.get("tts_text"),
-            Engine="standard",
-        )
+    def synthesize(self, tts_text: str, voice_id: str) -> io.BytesIO:
+        """
+        Call Polly and return the audio in Memory
+        """
+        audio_stream, timings = self.synthesize_chunked(tts_text, voice_id)
+        logger.info(f"TTS synthesized in {len(timings)} chunks: {timings}")
+        return audio_stream
+
+    def store_tts(self, tts_dict: dict, s3_client, s3_key: str) -> Future:
+        """
+        Store the audio for tts_dict at s3_key. Each synthesis is kept once
+        under an immutable content addressed key, text synthesised before
+        is copied server side from there instead of calling Polly.
+        Return the future of the page upload, already done on a cache hit
+        """
+        voice_id = get_voice_id(tts_dict["gender"])
+        digest = tts_cache_key(tts_dict["tts_text"], voice_id)
+        cache_key = tts_cache_object_key(digest)
+
+        cached = self.cache.get(digest) is not None
+        if not cached and s3_client.object_exists(cache_key):
+            # Stored by another process or before a restart
+            self.cache.put(digest, cache_key)
+            cached = True
+        if cached:
+            if s3_client.copy_object(cache_key, s3_key):
+                logger.info(f"TTS Cache hit for {s3_key}")
+                done = Future()
+                done.set_result(True)
+                return done
+            # The cache object is gone (expired)
+            self.cache.evict(digest)
+
+        audio = self.synthesize(tts_dict["tts_text"], voice_id).getvalue()
+        cache_upload = s3_client.submit_upload(io.BytesIO(audio), cache_key)
+
+        def index_cache_object(cache_upload: Future):
+            # Only indexed once stored, a copy never reads a partial object
+            if cache_upload.exception() is None:
+                self.cache.put(digest, cache_key)
+
+        cache_upload.add_done_callback(index_cache_object)
+        upload = s3_client.submit_upload(io.BytesIO(audio), s3_key)
+        logger.info("TTS Creation success!")
+        return upload
+
+    def convert_to_tts(self, new_tts_file: dict) -> bool:
+        """
+        Convert text to audio in Memory
+        """
 
-        audio_stream = io.BytesIO(response["AudioStream"].read())
+        voice_id = get_voice_id(new_tts_file["gender"])
+        audio_stream = self.synthesize(new_tts_file.get("tts_text"), voice_id)
         logger.info("TTS Creation success!")
 
         return audio_stream
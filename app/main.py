@@ -1,6 +1,6 @@
 from fastapi import FastAPI
-from settings.nolo_config import NoloCFG
-from router import booklet, reader, token, sign
+from settings.nolo_config import get_config
+from router import booklet, reader, token, sign, health
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
@@ -11,7 +11,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 # Load Config
-api_config = NoloCFG()
+api_config = get_config()
 
 # Declare fastAPI
 
@@ -59,6 +59,7 @@ async def docs():
 
 
 # Router
+app.include_router(health.router)
 app.include_router(token.router)
 app.include_router(sign.router)
 app.include_router(reader.router)
@@ -0,0 +1,22 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+
+class IngestJob(BaseModel):
+    job_id: str
+    status: str
+    file_name: Optional[str] = None
+    doc_id: Optional[str] = None
+    doc_title: Optional[str] = None
+    owner_id: Optional[str] = None
+    pages_total: int = 0
+    pages_done: int = 0
+    pages: List[int] = Field(
+        default_factory=list, description="Page numbers already processed"
+    )
+    error: Optional[str] = None
+    page_report: Optional[Dict[str, int]] = Field(
+        default=None, description="Pages by type, blank and text only are skipped"
+    )
+    created_at: int
+    modify_at: int
@@ -56,6 +56,13 @@ class BookletList(RootModel[List[Booklet]]):
     root: List[Booklet]
 
 
+class BookletPage(BaseModel):
+    items: List[Booklet]
+    next: Optional[str] = Field(
+        default=None, description="Cursor of the next page, None on the last page"
+    )
+
+
 # Partial Edits Models
 class PageElementEdit(BaseModel):
     text: Optional[str] = None
@@ -1,14 +1,41 @@
-from typing import Dict
+from typing import List
 import time
-from fastapi import APIRouter, Depends, Form, HTTPException, status, UploadFile, File
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Form,
+    HTTPException,
+    Query,
+    status,
+    UploadFile,
+    File,
+)
 import os
-from handlers.pdf_handler import NoloPDFHandler
-from handlers.db_handler import NoloDBHandler
+import shutil
+import threading
+from uuid import uuid4
+from fastapi.concurrency import run_in_threadpool
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from handlers.db_handler import (
+    NoloDBHandler,
+    OWNER_INDEX_NAME,
+    set_published_shelf,
+    counter_update,
+    update_item_and_counter,
+    transact_counter_updates,
+    is_version_conflict,
+)
+from handlers.job_handler import NoloJobQueue, NoloIngestWorker, load_pdf_handler
 from handlers.s3_handler import NoloBlobAPI
+from handlers.cache_handler import bookshelf_cache
 from handlers.dep_handler import get_current_active_user
 from handlers.ral_handler import NoloRateLimit
+from utils.io_pool import io_pool
 from models.iam_model import User
-from models.rdr_model import Booklet, BookletEdit
+from models.rdr_model import Booklet, BookletEdit, BookletPage
+from models.job_model import IngestJob
 import logging
 
 # Create Logger
@@ -23,15 +50,27 @@ MODULE_DESCRIPTION = ""
 MAX_CALLS_ALLOWED_PER_MIN = 10
 MAX_TIME_WAIT_429_IN_SECS = 60
 MAX_PENALTY_TIME_429_IN_SECS = 300
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+BOOKLET_EDIT_PROJECTION = (
+    "doc_id, doc_name, doc_title, doc_description, owner_id, update_counter, pages"
+)
+MAX_PAGE_SIZE = 100
+PAGE_REFRESH_LOCK_STRIPES = 64
+MAX_TRANSACT_ITEMS = 100  # DynamoDB TransactWriteItems limit
 
 router = APIRouter(prefix=MODULE_PREFIX, tags=MODULE_TAGS)
 
 # Handlers
 db = NoloDBHandler()
 blob = NoloBlobAPI()
+job_queue = NoloJobQueue()
+ingest_worker = NoloIngestWorker(job_queue, db)
+
+# One lock per stripe of (doc_id, page_num), serialises page refreshes
+page_refresh_locks = [threading.Lock() for _ in range(PAGE_REFRESH_LOCK_STRIPES)]
 
 # Environment
-upload_path = os.getenv("UPLOAD_PATH")
+upload_path = os.getenv("UPLOAD_PATH") or "./data/uploads"
 
 # Rate Limit 10 calls in 60 seconds
 rate_limit = NoloRateLimit(
@@ -46,29 +85,126 @@ RATE_LIMIT = Depends(rate_limit)
 # Helper Function
 
 
-def update_item_and_counter(table, item_key: Dict, attributes: Dict) -> Dict:
-    # Init Update expression
-    update_expression = "SET"
-
-    # Build  expression-attributes-names and values
-    expression_attrib_names = {}
-    expression_attrib_values = {}
-    for key, value in attributes.items():
-        if key != "doc_id":
-            update_expression += f" #{key} = :{key}, "
-            expression_attrib_names[f"#{key}"] = key
-            expression_attrib_values[f":{key}"] = value
-    # Finish update-expression
-    # update_expression += " update_counter = if_not_exists(update_counter, :_start) + :_inc"
-    update_expression = update_expression[:-2]
-
-    return table.update_item(
-        Key=item_key,
-        UpdateExpression=update_expression,
-        ExpressionAttributeNames=expression_attrib_names,
-        ExpressionAttributeValues=expression_attrib_values,
-        ReturnValues="ALL_NEW",
-    )
+def save_upload(upload, file_path: str):
+    """
+    Stream the spooled upload to disk, the PDF is never fully in memory
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    try:
+        with open(file_path, "wb") as f:
+            shutil.copyfileobj(upload, f, UPLOAD_CHUNK_SIZE)
+    except Exception:
+        # No partial PDF is left behind for a job that never gets queued
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+
+def page_refresh_lock(doc_id: str, page_num) -> threading.Lock:
+    return page_refresh_locks[hash((doc_id, int(page_num))) % len(page_refresh_locks)]
+
+
+def refresh_booklet_page(pdf_handler, table, doc_id: str, page: dict):
+    """
+    Rebuild the objects of one edited page unless a later PATCH moved its
+    update_counter on, the refresh scheduled by that PATCH wins. The page
+    lock keeps two refreshes of the same page from writing its S3 keys at
+    once
+    """
+    page_key = {"doc_id": doc_id, "page_num": page["page_num"]}
+    with page_refresh_lock(doc_id, page["page_num"]):
+        stored = table.get_item(
+            Key=page_key,
+            ProjectionExpression="update_counter",
+            ConsistentRead=True,
+        ).get("Item")
+        if stored is None or stored.get("update_counter") != page["update_counter"]:
+            logger.info(f"Booklet {doc_id} Page {page['page_num']} refresh superseded")
+            return
+
+        elements = pdf_handler.refresh_page_sync(
+            page["page_num"], page["text"], page["img_text"]
+        )
+        update_expression = "SET #create_tts = :create_tts"
+        expression_attrib_names = {
+            "#create_tts": "create_tts",
+            "#update_counter": "update_counter",
+        }
+        expression_attrib_values = {":create_tts": False}
+        for key in ("lang", "lang_accuracy"):
+            if key in elements:
+                update_expression += f", #elements.#{key} = :{key}"
+                expression_attrib_names["#elements"] = "elements"
+                expression_attrib_names[f"#{key}"] = key
+                expression_attrib_values[f":{key}"] = elements[key]
+
+        if page["update_counter"] is None:
+            condition = "attribute_not_exists(#update_counter)"
+        else:
+            condition = "#update_counter = :update_counter"
+            expression_attrib_values[":update_counter"] = page["update_counter"]
+        try:
+            table.update_item(
+                Key=page_key,
+                UpdateExpression=update_expression,
+                ConditionExpression=condition,
+                ExpressionAttributeNames=expression_attrib_names,
+                ExpressionAttributeValues=expression_attrib_values,
+            )
+        except ClientError as e:
+            if not is_version_conflict(e):
+                raise
+            # Edited again meanwhile, its own refresh clears create_tts
+            logger.info(f"Booklet {doc_id} Page {page['page_num']} refresh superseded")
+
+
+def refresh_booklet_pages(doc_id: str, doc_name: str, changed_pages: list):
+    """
+    Background Task: rebuild the txt and tts objects of the edited pages
+    and clear their create_tts flag. Each page carries the update_counter
+    written by its PATCH
+    """
+    NoloPDFHandler = load_pdf_handler()
+    pdf_handler = NoloPDFHandler(file_name=f"{doc_name}.pdf", doc_id=doc_id)
+    table = db.get_pages_table()
+
+    with ThreadPoolExecutor(max_workers=pdf_handler.max_workers) as pool:
+        futures = [
+            (
+                page,
+                pool.submit(refresh_booklet_page, pdf_handler, table, doc_id, page),
+            )
+            for page in changed_pages
+        ]
+
+    for page, future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            logger.error(
+                f"Booklet {doc_id} Page {page['page_num']} refresh failed. Reason: {e}"
+            )
+
+
+def delete_booklet_files(doc_id: str):
+    """
+    Background Task: delete the S3 files of a deleted booklet
+    """
+    if blob.delete_booklet_assets(doc_id):
+        logger.info(f"Booklet {doc_id} all related files deleted!")
+    else:
+        logger.error(f"Booklet {doc_id} files deletion failed")
+
+
+# Background Workers
+@router.on_event("startup")
+async def start_ingest_worker():
+    ingest_worker.start()
+
+
+@router.on_event("shutdown")
+async def stop_ingest_worker():
+    await ingest_worker.stop()
 
 
 # Routes
@@ -86,9 +222,9 @@ def ping(user: User = Depends(get_current_active_user)):
 @router.post(
     "/upload",
     summary="Upload Booklet to be processed",
-    response_model=Booklet,
+    response_model=IngestJob,
     dependencies=[PROTECTED, RATE_LIMIT],
-    status_code=status.HTTP_201_CREATED,
+    status_code=status.HTTP_202_ACCEPTED,
 )
 async def upload_file(
     file: UploadFile = File(...),
@@ -113,40 +249,74 @@ async def upload_file(
     if user.disabled:
         raise user_inactive_exception
 
-    # Save File Locally
+    # Save File Locally, off the event loop
     logger.info(f"Booklet {file.filename} started!")
-    # Read file into memory
-    file_data = await file.read()
-
-    # Invoke PDF Handler
-    pdf_handler = NoloPDFHandler(file_name=file.filename, description=description)
-    # response = await pdf_handler.async_extract_text_from_file()
-    response = await pdf_handler.async_extract_text_from_file(file_data)
-    if not response:
-        logger.error(f"Failed to extract Text from Booklet {title}")
-        raise HTTPException(status_code=400, detail="Failed to extract Text from File")
-
-    response = await pdf_handler.async_create_image_from_file(file_data)
-    if not response:
-        logger.error(f"Failed to extract Images from PDF {title}")
-        raise HTTPException(status_code=400, detail="Failed to extract Images from PDF")
-
-    file_metadata = pdf_handler.get_file_metadata()
-    file_metadata.update(
-        {
-            "owner_id": user.username,
-            "is_published": True,
-            "doc_title": title,
-            "doc_description": description,
-        }
+    file_path = os.path.join(upload_path, f"{uuid4().hex}.pdf")
+    await run_in_threadpool(save_upload, file.file, file_path)
+
+    # Queue the Booklet for the Ingest Workers
+    job = await io_pool.run(
+        job_queue.enqueue,
+        file_path=file_path,
+        file_name=file.filename,
+        title=title,
+        description=description,
+        owner_id=user.username,
     )
+    logger.info(f"Booklet {file.filename} queued as job {job['job_id']}")
+    return job
+
+
+@router.get(
+    "/jobs",
+    summary="List the Ingest Jobs of the current user",
+    response_model=List[IngestJob],
+    dependencies=[PROTECTED, RATE_LIMIT],
+)
+async def get_all_jobs(user: User = Depends(get_current_active_user)):
+    return await io_pool.run(job_queue.get_jobs_by_owner, user.username)
+
+
+@router.get(
+    "/jobs/{job_id}",
+    summary="Get the status and page progress of an Ingest Job",
+    response_model=IngestJob,
+    dependencies=[PROTECTED, RATE_LIMIT],
+)
+async def get_one_job(job_id: str, user: User = Depends(get_current_active_user)):
+    job = await io_pool.run(job_queue.get_job, job_id)
+    if job is None or job["owner_id"] != user.username:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="The Ingest Job does not exists",
+        )
+    return job
+
+
+@router.get(
+    "/mine",
+    summary="List the Booklets of the current user, last modified first",
+    response_model=BookletPage,
+    dependencies=[PROTECTED, RATE_LIMIT],
+)
+async def get_my_booklets(
+    limit: int = Query(default=25, ge=1, le=MAX_PAGE_SIZE),
+    next: str | None = None,
+    user: User = Depends(get_current_active_user),
+):
+    try:
+        items, next_cursor = await db.async_query_index(
+            OWNER_INDEX_NAME, "owner_id", user.username, limit, next
+        )
+    except ValueError as e:
+        logger.warning(f"Bad booklet cursor REASON: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid next cursor",
+        )
 
-    # Send file_metadata to DynamoDB
-    table = db.get_table()
-    table.put_item(Item=file_metadata)
-    logger.info(f"Booklet {file.filename} uploaded sucessfully!")
-    logger.info(f"Booklet {file.filename} completed!")
-    return file_metadata
+    blob.set_cover_urls(items)
+    return {"items": items, "next": next_cursor}
 
 
 # UPDATE
@@ -157,7 +327,10 @@ async def upload_file(
     dependencies=[PROTECTED, RATE_LIMIT],
 )
 async def update_one_booklet(
-    doc_id: str, booklet: BookletEdit, user: User = Depends(get_current_active_user)
+    doc_id: str,
+    booklet: BookletEdit,
+    background_tasks: BackgroundTasks,
+    user: User = Depends(get_current_active_user),
 ):
     update_doc_exception = HTTPException(
         status_code=status.HTTP_400_BAD_REQUEST,
@@ -174,6 +347,16 @@ async def update_one_booklet(
         detail="User is inactive",
     )
 
+    conflict_exception = HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="The Booklet was modified meanwhile, try again",
+    )
+
+    too_many_pages_exception = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"At most {MAX_TRANSACT_ITEMS - 1} pages can be edited at once",
+    )
+
     if user.disabled:
         raise user_inactive_exception
 
@@ -182,10 +365,9 @@ async def update_one_booklet(
         item_key = {"doc_id": doc_id}
         table = db.get_table()
         logger.info(f"Searching Booklet {doc_id}")
-        response = table.get_item(Key=item_key)
 
         # Extract the Document to be edited
-        item = response.get("Item")
+        item = await db.async_get_item(item_key, BOOKLET_EDIT_PROJECTION)
 
         if item is None:
             logger.warning(f"Booklet {doc_id} Not found")
@@ -193,47 +375,123 @@ async def update_one_booklet(
         else:
             logger.info(f"Booklet {doc_id} found")
 
-        # Evaluate Update Cases:
-        edited_pages_list = []
-        edited_dict = {}
-
         # Capture Updates on Pages from Request
-        if len(booklet.pages) > 0:
-            for edit in booklet.pages:
-                edited_dict = {
-                    "page_num": edit.page_num,
-                    "create_tts": True,
-                    "elements": {
-                        "text": edit.elements.text,
-                        "img_text": edit.elements.img_text,
-                    },
-                }
-                edited_pages_list.append(edited_dict)
-                # Modify only the page elements marked for edition
-            for page in item["pages"]:
-                for elem in edited_pages_list:
-                    if elem["page_num"] == page["page_num"]:
-                        page["create_tts"] = elem["create_tts"]
-                        page["elements"]["text"] = elem["elements"]["text"]
-                        page["elements"]["img_text"] = elem["elements"]["img_text"]
-                        # TODO: Recreate TTS Files for Updated Pages Only
-
-        # Create Modified Metadata
-        item["doc_title"] = booklet.doc_title
-        item["doc_description"] = booklet.doc_description
-        item["modify_at"] = int(time.time())
-        item["owner_id"] = user.username
+        edits = {
+            edit.page_num: edit.elements
+            for edit in booklet.pages or []
+            if edit.elements is not None
+        }
 
-        # Send the Update to Database
-        udpd_expr = update_item_and_counter(
-            table=table, item_key=item_key, attributes=item
-        )
+        # Booklets stored before the pages table are migrated on their
+        # first edit, otherwise only the edited pages are read
+        legacy_pages = item.pop("pages", None)
+        if legacy_pages is not None:
+            logger.info(f"Booklet {doc_id} pages moved to the pages table")
+            pages = legacy_pages
+        else:
+            pages = await db.async_get_pages_by_num(doc_id, edits)
+
+        # Modify only the page elements whose content changed
+        changed_pages = []
+        page_deltas = []
+        for page in pages:
+            edit = edits.get(page["page_num"])
+            if edit is None:
+                continue
+
+            delta = {}
+            new_text, new_img_text = None, None
+            if edit.text is not None and edit.text != page["elements"].get("text"):
+                new_text = edit.text
+                delta["elements.text"] = page["elements"]["text"] = new_text
+            if edit.img_text is not None and edit.img_text != page["elements"].get(
+                "img_text"
+            ):
+                new_img_text = edit.img_text
+                delta["elements.img_text"] = page["elements"]["img_text"] = new_img_text
+
+            if not delta:
+                continue
+
+            delta["create_tts"] = page["create_tts"] = True
+            page_deltas.append((page, delta))
+            changed_pages.append(
+                {
+                    "page_num": int(page["page_num"]),
+                    "text": new_text,
+                    "img_text": new_img_text,
+                    "update_counter": page.get("update_counter"),
+                }
+            )
+
+        # Create Modified Metadata, fields left out of the request are kept
+        header_delta = {
+            key: value
+            for key, value in {
+                "doc_title": booklet.doc_title,
+                "doc_description": booklet.doc_description,
+                "owner_id": user.username,
+            }.items()
+            if value is not None and value != item.get(key)
+        }
+        header_delta["modify_at"] = int(time.time())
+        item.update(header_delta)
+
+        if legacy_pages is not None:
+            # The header keeps the legacy pages until its conditional write
+            # succeeds, a retry after a conflict migrates them again
+            await db.async_put_pages(doc_id, legacy_pages)
+            await io_pool.run(
+                update_item_and_counter,
+                table=table,
+                item_key=item_key,
+                attributes=header_delta,
+                expected_counter=item.get("update_counter"),
+                remove=["pages"],
+            )
+        else:
+            if len(page_deltas) >= MAX_TRANSACT_ITEMS:
+                raise too_many_pages_exception
+            # The header and the edited pages are written all or nothing
+            updates = [
+                (
+                    table,
+                    counter_update(item_key, header_delta, item.get("update_counter")),
+                )
+            ]
+            pages_table = db.get_pages_table()
+            for (page, delta), changed_page in zip(page_deltas, changed_pages):
+                updates.append(
+                    (
+                        pages_table,
+                        counter_update(
+                            {"doc_id": doc_id, "page_num": page["page_num"]},
+                            delta,
+                            page.get("update_counter"),
+                        ),
+                    )
+                )
+                # The refresh only runs while this edit is the latest
+                changed_page["update_counter"] = (page.get("update_counter") or 0) + 1
+            await io_pool.run(transact_counter_updates, updates)
+
+        bookshelf_cache.invalidate(f"by update of {doc_id}")
+
+        # Recreate TTS Files for Updated Pages Only
+        if changed_pages:
+            logger.info(f"Booklet {doc_id} pages to refresh: {len(changed_pages)}")
+            background_tasks.add_task(
+                refresh_booklet_pages, doc_id, item.get("doc_name"), changed_pages
+            )
 
         return {"booklet_id": doc_id, "username": user.username, "item": item}
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(
-            f"Booklet {doc_id} Update failed. Reason: {e}", extra={"error": udpd_expr}
-        )
+        if is_version_conflict(e):
+            logger.warning(f"Booklet {doc_id} Update conflict")
+            raise conflict_exception
+        logger.error(f"Booklet {doc_id} Update failed. Reason: {e}", extra={"error": e})
         raise update_doc_exception
 
 
@@ -260,18 +518,20 @@ async def toogle_visibility_booklet(
         detail="User is inactive",
     )
 
+    conflict_exception = HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="The Booklet was modified meanwhile, try again",
+    )
+
     # Check if user is logged in
     if user.disabled:
         raise user_inactive_exception
 
     try:
         item_key = {"doc_id": doc_id}
-        # Delete DynamoDB Info
+        # Read only the state to toggle and its version
         table = db.get_table()
-        response = table.get_item(Key=item_key)
-
-        # Check for Deletion
-        item = response.get("Item")
+        item = await db.async_get_item(item_key, "doc_id, is_published, update_counter")
 
         if item is None:
             logger.warning(f"Booklet {doc_id} Not found")
@@ -281,26 +541,38 @@ async def toogle_visibility_booklet(
 
         # Toggle the state of "is_published" attribute
         logger.info(f"Booklet visibility is set to {item['is_published']}")
-        item["is_published"] = not item["is_published"]  # Toggle the current State
-        item["modify_at"] = int(time.time())
+        delta = {
+            "is_published": not item["is_published"],  # Toggle the current State
+            "modify_at": int(time.time()),
+        }
+        set_published_shelf(delta)
 
-        logger.info(f"Booklet visibility is changed to {item['is_published']}")
+        logger.info(f"Booklet visibility is changed to {delta['is_published']}")
         # Send the Update to Database
-        udpd_expr = update_item_and_counter(
-            table=table, item_key=item_key, attributes=item
+        await io_pool.run(
+            update_item_and_counter,
+            table=table,
+            item_key=item_key,
+            attributes=delta,
+            expected_counter=item.get("update_counter"),
+            remove=[] if delta["is_published"] else ["published_shelf"],
         )
+        bookshelf_cache.invalidate(f"by visibility of {doc_id}")
 
         return {
             "booklet_id": doc_id,
             "username": user.username,
-            "is_published": item["is_published"],
-            "modify_at": item["modify_at"],
+            "is_published": delta["is_published"],
+            "modify_at": delta["modify_at"],
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(
-            f"Booklet {doc_id} Update failed. Reason: {e}", extra={"error": udpd_expr}
-        )
+        if is_version_conflict(e):
+            logger.warning(f"Booklet {doc_id} visibility conflict")
+            raise conflict_exception
+        logger.error(f"Booklet {doc_id} Update failed. Reason: {e}", extra={"error": e})
         raise update_doc_exception
 
 
@@ -309,7 +581,13 @@ async def toogle_visibility_booklet(
     "/{doc_id}", summary="Delete a Booklet", dependencies=[PROTECTED, RATE_LIMIT]
 )
 async def delete_one_booklet(
-    doc_id: str, user: User = Depends(get_current_active_user)
+    doc_id: str,
+    background_tasks: BackgroundTasks,
+    wait_for_files: bool = Query(
+        default=False,
+        description="Delete the S3 files before answering instead of in background",
+    ),
+    user: User = Depends(get_current_active_user),
 ):
     delete_doc_exception = HTTPException(
         status_code=status.HTTP_400_BAD_REQUEST,
@@ -331,24 +609,24 @@ async def delete_one_booklet(
 
     try:
         # Delete DynamoDB Info
-        table = db.get_table()
-        table.delete_item(Key={"doc_id": doc_id})
+        await db.async_delete_item({"doc_id": doc_id})
+        bookshelf_cache.invalidate(f"by delete of {doc_id}")
+        await db.async_delete_pages(doc_id)
 
         # Check for Deletion
-        response = table.get_item(Key={"doc_id": doc_id})
-        item = response.get("Item")
+        item = await db.async_get_item({"doc_id": doc_id})
         if item is not None:
             raise delete_doc_exception
 
-        # Delete Objects
-        blob_prefix = ["img", "txt"]
-        for prefix in blob_prefix:
-            filename = f"{prefix}/{doc_id}/"
-            response = blob.delete_all_objects_from_s3_folder(filename)
+        # Delete Objects: img, txt and tts
+        if wait_for_files:
+            response = await blob.async_delete_booklet_assets(doc_id)
             if not response:
                 raise delete_blob_exception
-
-        logger.info(f"Booklet {doc_id} and its all related files deleted!")
+            logger.info(f"Booklet {doc_id} and its all related files deleted!")
+        else:
+            background_tasks.add_task(delete_booklet_files, doc_id)
+            logger.info(f"Booklet {doc_id} deleted, files deletion scheduled")
     except Exception as e:
         logger.error(f"Booklet {doc_id} Delete failed", extra={"error": e})
         raise delete_doc_exception
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Response
+from handlers.health_handler import warmup
+from handlers.aws_handler import aws_clients
+from utils.io_pool import io_pool
+import logging
+
+# Create Logger
+logger = logging.getLogger(__name__)
+
+# Global Vars
+MODULE_NAME = "health"
+MODULE_PREFIX = "/health"
+MODULE_TAGS = [MODULE_NAME]
+
+# FastAPI Instance
+router = APIRouter(prefix=MODULE_PREFIX, tags=MODULE_TAGS)
+
+
+# Background Workers
+@router.on_event("startup")
+async def start_warmup():
+    warmup.start()
+
+
+# Routes
+@router.get("/live")
+async def live():
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready(response: Response):
+    """
+    503 until the startup warm-up is done
+    """
+    report = warmup.report()
+    if not report["ready"]:
+        response.status_code = 503
+    report["io_pool"] = io_pool.stats()
+    report["aws_pools"] = aws_clients.stats()
+    return report
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends
-from handlers.db_handler import NoloDBHandler
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from handlers.db_handler import NoloDBHandler, PUBLISHED_INDEX_NAME, PUBLISHED_SHELF
 from handlers.ral_handler import NoloRateLimit
 from handlers.s3_handler import NoloBlobAPI
-from models.rdr_model import Booklet, BookletList
+from handlers.cache_handler import bookshelf_cache, etag_matches
+from models.rdr_model import Booklet, BookletList, BookletPage, Page
+from typing import List
 import os
 import logging
 
@@ -18,6 +20,9 @@ MAX_CALLS_ALLOWED_PER_MIN = 25
 MAX_TIME_WAIT_429_IN_SECS = 60
 MAX_PENALTY_TIME_429_IN_SECS = 180
 URL_EXPIRATION_IN_SECS = os.getenv("URL_EXPIRATION_IN_SECS")
+BOOKSHELF_PROJECTION = "doc_id, doc_name, doc_title, doc_description, number_of_pages,owner_id, created_at, modify_at, cover_img, is_published, tts_ready"
+BOOKSHELF_MAX_PAGE_SIZE = 100
+MAX_PAGES_PER_WINDOW = 50
 
 # FastAPI Instance
 router = APIRouter(prefix=MODULE_PREFIX, tags=MODULE_TAGS)
@@ -55,62 +60,125 @@ def ping():
 
 
 # URI for Return all the Documents id, Name, Cover Page Thumbnail
+def build_bookshelf() -> bytes:
+    """
+    Scan the bookshelf and serialise it as the BookletList response
+    """
+    data = db.scan_all(BOOKSHELF_PROJECTION)
+    s3.set_cover_urls(data)
+
+    if not data:
+        logger.warning("No Data in Table")
+        raise HTTPException(status_code=404, detail=" Not Data in Table")
+    return BookletList(data).model_dump_json().encode()
+
+
 @router.get("/bookshelf", response_model=BookletList, dependencies=[RATE_LIMIT])
-def return_all_documents() -> dict:
+def return_all_documents(request: Request):
     """
-    return a JSON struct with all doc
+    return a JSON struct with all doc. Clients sending the current ETag
+    in If-None-Match get a 304 with no body
     """
     try:
-        table = db.get_table()
-        response = table.scan(
-            ProjectionExpression="doc_id, doc_name, doc_title, doc_description, number_of_pages,owner_id, created_at, modify_at, cover_img, is_published, tts_ready"
-        )
-        data = response["Items"]
-        # data = response["Count"]
-
-        # TODO: Calculate Presigned URL for Cover
-        for item in data:
-            img_file_key = f"img/{item['doc_id']}/{item['doc_id']}_page_01.png"
-            cover_img = s3.generate_presigned_url(img_file_key)
-            item["cover_img"] = cover_img
-
-        if not data:
-            logger.warning("No Data in Table")
-            raise HTTPException(status_code=404, detail=" Not Data in Table")
-        return data
+        body, etag = bookshelf_cache.get_or_build(build_bookshelf)
     except Exception as e:
         logger.error(f"No Data Found REASON: {e}", extra={"error": e})
         raise HTTPException(status_code=404, detail=" Not Data in Table")
 
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/bookshelf/paged", response_model=BookletPage, dependencies=[RATE_LIMIT])
+def return_documents_page(
+    limit: int = Query(default=25, ge=1, le=BOOKSHELF_MAX_PAGE_SIZE),
+    next: str | None = None,
+) -> dict:
+    """
+    return one page of the bookshelf and the cursor of the next one
+    """
+    try:
+        data, next_cursor = db.scan_page(BOOKSHELF_PROJECTION, limit, cursor=next)
+    except ValueError as e:
+        logger.warning(f"Bad bookshelf cursor REASON: {e}")
+        raise HTTPException(status_code=400, detail="Invalid next cursor")
+
+    s3.set_cover_urls(data)
+    return {"items": data, "next": next_cursor}
+
+
+@router.get(
+    "/bookshelf/published", response_model=BookletPage, dependencies=[RATE_LIMIT]
+)
+def return_published_documents(
+    limit: int = Query(default=25, ge=1, le=BOOKSHELF_MAX_PAGE_SIZE),
+    next: str | None = None,
+) -> dict:
+    """
+    return the published booklets, last modified first
+    """
+    try:
+        data, next_cursor = db.query_index(
+            PUBLISHED_INDEX_NAME, "published_shelf", PUBLISHED_SHELF, limit, next
+        )
+    except ValueError as e:
+        logger.warning(f"Bad bookshelf cursor REASON: {e}")
+        raise HTTPException(status_code=400, detail="Invalid next cursor")
+
+    s3.set_cover_urls(data)
+    return {"items": data, "next": next_cursor}
+
 
 @router.get("/bookshelf/{item_id}", response_model=Booklet, dependencies=[RATE_LIMIT])
 async def return_one_item(item_id: str):
     """
     GET One Item
     """
-    table = db.get_table()
-    response = table.get_item(Key={"doc_id": item_id})
-    item = response.get("Item")
-
-    # Recalculate the presigned URL for each page
-    for page in item["pages"]:
-        page_name = page["file_name"]
-        hashed_name = page["master_doc"]
-        tts_file_key = f"tts/{hashed_name}/{page_name[:-4]}.mp3"
-        img_file_key = f"img/{hashed_name}/{page_name}"
-        img_tts_file = page_name[:8] + "_img_desc" + page_name[8:-4] + ".mp3"
-        img_tts_file_key = f"tts/{hashed_name}/{img_tts_file}"
-        txt_file_key = f"txt/{hashed_name}/{page_name[:-4]}.txt"
-        tts_url = s3.generate_presigned_url(tts_file_key)
-        img_url = s3.generate_presigned_url(img_file_key)
-        txt_url = s3.generate_presigned_url(txt_file_key)
-        img_tts_url = s3.generate_presigned_url(img_tts_file_key)
-        page["elements"]["img_url"] = img_url
-        page["elements"]["tts_url"] = tts_url
-        page["elements"]["txt_file_url"] = txt_url
-        page["elements"]["img_tts_url"] = img_tts_url
+    item = await db.async_get_item({"doc_id": item_id})
 
     if not item:
         raise HTTPException(status_code=404, detail=f" Not item {item_id} in Table")
 
+    # Booklets stored before the pages table keep their pages embedded
+    if "pages" not in item:
+        item["pages"] = await db.async_get_pages(item_id)
+
+    # Recalculate the presigned URL for each page
+    s3.set_page_urls(item["pages"])
     return item
+
+
+@router.get(
+    "/bookshelf/{item_id}/pages", response_model=List[Page], dependencies=[RATE_LIMIT]
+)
+async def return_item_pages(
+    item_id: str,
+    first_page: int = Query(default=1, alias="from", ge=1),
+    last_page: int | None = Query(default=None, alias="to", ge=1),
+):
+    """
+    GET a window of pages of One Item, from and to are page numbers
+    """
+    last_page = min(
+        last_page or first_page + MAX_PAGES_PER_WINDOW - 1,
+        first_page + MAX_PAGES_PER_WINDOW - 1,
+    )
+    if last_page < first_page:
+        raise HTTPException(status_code=400, detail="to must not be before from")
+
+    pages = await db.async_get_pages(item_id, first_page, last_page)
+    if not pages:
+        # Legacy booklet with embedded pages, or a missing one
+        item = await db.async_get_item({"doc_id": item_id}, "doc_id, pages")
+        if not item:
+            raise HTTPException(status_code=404, detail=f" Not item {item_id} in Table")
+        pages = [
+            page
+            for page in item.get("pages", [])
+            if first_page <= page["page_num"] <= last_page
+        ]
+
+    s3.set_page_urls(pages)
+    return pages
@@ -72,7 +72,7 @@ async def sign_up(
     # Exceptions
 
     # Get One User
-    user = user_db.get_one_user(username=username)
+    user = await user_db.async_get_one_user(username)
 
     if user:
         return None
@@ -81,12 +81,12 @@ async def sign_up(
         "username": username,
         "email": email,
         "full_name": full_name,
-        "hashed_password": tkn.get_password_hash(password),
+        "hashed_password": await tkn.async_get_password_hash(password),
         "disabled": True,
         "user_id": f"{uuid.uuid4().hex}",
     }
 
-    status = user_db.insert_user(new_user)
+    status = await user_db.async_insert_user(new_user)
 
     if status != 200:
         raise
@@ -1,12 +1,13 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Response, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from typing import Annotated
+import asyncio
 from handlers.ral_handler import NoloRateLimit
 
 # Module specific Libraries
 from models.iam_model import User
 from models.jwt_model import Token
-from handlers.tkn_handler import NoloToken
+from handlers.tkn_handler import NoloToken, start_hash_pool, stop_hash_pool
 from handlers.db_handler import NoloUserDB
 from handlers.dep_handler import get_current_active_user
 import logging
@@ -45,12 +46,23 @@ PROTECTED = Depends(get_current_active_user)
 RATE_LIMIT = Depends(rate_limit)
 
 
+# Background Workers
+@router.on_event("startup")
+async def start_password_hashing():
+    await asyncio.to_thread(start_hash_pool)
+
+
+@router.on_event("shutdown")
+async def stop_password_hashing():
+    await asyncio.to_thread(stop_hash_pool)
+
+
 # Utilities Function
-def authenticate_user(username: str, password: str):
-    user = user_db.get_one_user(username)
+async def authenticate_user(username: str, password: str):
+    user = await user_db.async_get_one_user(username)
     if not user:
         return False
-    if not iam.verify_password(password, user.hashed_password):
+    if not await iam.async_verify_password(password, user.hashed_password):
         return False
     return user
 
@@ -62,7 +74,7 @@ def authenticate_user(username: str, password: str):
 async def login_for_access_token(
     response: Response, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ):
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
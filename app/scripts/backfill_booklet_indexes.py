@@ -0,0 +1,131 @@
+"""
+Create the Booklet GSIs on an existing table and backfill their keys.
+
+    python -m scripts.backfill_booklet_indexes [--dry-run]
+
+Run from the app folder with the API environment loaded.
+"""
+import os
+import json
+import time
+import argparse
+from handlers.aws_handler import aws_clients
+from handlers.db_handler import (
+    NoloDBHandler,
+    PUBLISHED_SHELF,
+    update_item_and_counter,
+    is_version_conflict,
+)
+import logging
+
+
+# Create Logger
+logger = logging.getLogger(__name__)
+
+# Table Definition
+TABLE_DEFINITION_PATH = os.path.join(os.path.dirname(__file__), "booklet_table.json")
+INDEX_POLL_INTERVAL_IN_SECS = 15
+
+# DynamoDB control plane client
+client = aws_clients.client("dynamodb")
+
+
+def create_missing_indexes(table_name: str, dry_run: bool):
+    """
+    Add the GSIs of booklet_table.json missing from the table, one at a
+    time since DynamoDB only builds one index per UpdateTable
+    """
+    with open(TABLE_DEFINITION_PATH) as f:
+        definition = json.load(f)
+
+    table = client.describe_table(TableName=table_name)["Table"]
+    existing = {index["IndexName"] for index in table.get("GlobalSecondaryIndexes", [])}
+    for index in definition["GlobalSecondaryIndexes"]:
+        if index["IndexName"] in existing:
+            logger.info(f"Index {index['IndexName']} already exists")
+            continue
+
+        logger.info(f"Creating Index {index['IndexName']}")
+        if dry_run:
+            continue
+        client.update_table(
+            TableName=table_name,
+            AttributeDefinitions=definition["AttributeDefinitions"],
+            GlobalSecondaryIndexUpdates=[{"Create": index}],
+        )
+        wait_for_index(table_name, index["IndexName"])
+
+
+def wait_for_index(table_name: str, index_name: str):
+    while True:
+        table = client.describe_table(TableName=table_name)["Table"]
+        status = {
+            index["IndexName"]: index["IndexStatus"]
+            for index in table.get("GlobalSecondaryIndexes", [])
+        }
+        if status.get(index_name) == "ACTIVE":
+            logger.info(f"Index {index_name} is ACTIVE")
+            return
+        logger.info(f"Index {index_name} is {status.get(index_name)}, waiting")
+        time.sleep(INDEX_POLL_INTERVAL_IN_SECS)
+
+
+def backfill_index_keys(db: NoloDBHandler, dry_run: bool) -> int:
+    """
+    Set modify_at where missing and published_shelf on published booklets,
+    items without the index keys are left out of the indexes. Each write is
+    conditional on the update_counter scanned, a booklet edited since is
+    skipped and keeps the keys its own write set
+    """
+    table = db.get_table()
+    items = db.scan_all(
+        "doc_id, is_published, published_shelf, created_at, modify_at, "
+        "update_counter"
+    )
+    updated = 0
+    for item in items:
+        set_values, remove = {}, []
+        if "modify_at" not in item:
+            set_values["modify_at"] = item.get("created_at") or int(time.time())
+        if item.get("is_published") and item.get("published_shelf") != PUBLISHED_SHELF:
+            set_values["published_shelf"] = PUBLISHED_SHELF
+        if not item.get("is_published") and "published_shelf" in item:
+            remove.append("published_shelf")
+        if not set_values and not remove:
+            continue
+
+        logger.info(f"Booklet {item['doc_id']}: set {set_values} remove {remove}")
+        if dry_run:
+            updated += 1
+            continue
+
+        try:
+            update_item_and_counter(
+                table,
+                item_key={"doc_id": item["doc_id"]},
+                attributes=set_values,
+                expected_counter=item.get("update_counter"),
+                remove=remove,
+            )
+            updated += 1
+        except Exception as e:
+            if not is_version_conflict(e):
+                raise
+            # Edited or deleted while the backfill was running
+            logger.info(f"Booklet {item['doc_id']} skipped, changed since the scan")
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    db = NoloDBHandler()
+    create_missing_indexes(db.table_name, args.dry_run)
+    updated = backfill_index_keys(db, args.dry_run)
+    logger.info(f"Backfill done, {updated} booklets updated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Login storm against the password hashing pool.
+
+    python -m scripts.bench_login [--logins 200] [--kill-worker]
+
+Run from the app folder. Every login is one bcrypt verify, fired all at
+once like a burst on /token. Reports the logins served and shed with a
+503, their latency and the worst event loop stall, which must stay low
+while bcrypt runs in the worker processes.
+"""
+import os
+import time
+import signal
+import asyncio
+import argparse
+import statistics
+from fastapi import HTTPException
+from handlers import tkn_handler
+from handlers.tkn_handler import NoloToken, start_hash_pool, stop_hash_pool
+import logging
+
+
+# Create Logger
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s:%(message)s")
+
+# Loop Stall Probe
+PROBE_INTERVAL_IN_SECS = 0.01
+PASSWORD = "storm-password"
+
+
+async def probe_loop(stop: asyncio.Event) -> float:
+    """
+    Worst delay of a PROBE_INTERVAL_IN_SECS sleep while the storm runs
+    """
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL_IN_SECS)
+        worst = max(worst, time.perf_counter() - start - PROBE_INTERVAL_IN_SECS)
+    return worst
+
+
+async def login(iam: NoloToken, hashed: str) -> tuple:
+    start = time.perf_counter()
+    try:
+        assert await iam.async_verify_password(PASSWORD, hashed)
+        status_code = 200
+    except HTTPException as e:
+        status_code = e.status_code
+    return status_code, time.perf_counter() - start
+
+
+def kill_one_worker():
+    pid = next(iter(tkn_handler.hash_pool._processes))
+    logger.info(f"Killing hashing worker {pid}")
+    os.kill(pid, signal.SIGKILL)
+
+
+async def storm(logins: int, kill_worker: bool):
+    iam = NoloToken()
+    hashed = await iam.async_get_password_hash(PASSWORD)
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_loop(stop))
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(login(iam, hashed)) for _ in range(logins)]
+    if kill_worker:
+        await asyncio.sleep(0.05)
+        kill_one_worker()
+    results = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    worst_stall = await probe
+
+    served = sorted(latency for code, latency in results if code == 200)
+    shed = sum(1 for code, _ in results if code == 503)
+    logger.info(
+        f"{logins} logins in {elapsed:.2f}s: {len(served)} served, {shed} shed "
+        f"with 503, {len(served) / elapsed:.1f} logins/s"
+    )
+    if served:
+        logger.info(
+            f"Latency p50 {statistics.median(served) * 1000:.0f} ms, "
+            f"max {served[-1] * 1000:.0f} ms"
+        )
+    logger.info(f"Worst event loop stall {worst_stall * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument(
+        "--kill-worker",
+        action="store_true",
+        help="SIGKILL a hashing worker mid storm, the pool must recover",
+    )
+    args = parser.parse_args()
+
+    for name, value in {
+        "JWT_ALGORITHM": "HS256",
+        "JWT_TOKEN_EXPIRES_MIN": "30",
+        "JWT_TOKEN_REFRESH_MIN": "60",
+    }.items():
+        os.environ.setdefault(name, value)
+
+    start = time.perf_counter()
+    start_hash_pool()
+    logger.info(f"Pool ready in {time.perf_counter() - start:.2f}s")
+    try:
+        asyncio.run(storm(args.logins, args.kill_worker))
+    finally:
+        stop_hash_pool()
+
+
+if __name__ == "__main__":
+    main()
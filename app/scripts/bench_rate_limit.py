@@ -0,0 +1,61 @@
+"""
+Microbenchmark of the in process Rate Limit store.
+
+    python -m scripts.bench_rate_limit [--clients 100000] [--rounds 5]
+
+Run from the app folder.
+"""
+import time
+import argparse
+from handlers.ral_handler import NoloMemoryRateLimitStore
+import logging
+
+
+# Create Logger
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s:%(message)s")
+
+# Limits of the reader router
+WINDOW_IN_SECS = 60
+REQUESTS_LIMIT = 25
+PENALTY_IN_SECS = 180
+
+
+def run(clients: int, rounds: int):
+    store = NoloMemoryRateLimitStore()
+    keys = [
+        f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:/reader" for i in range(clients)
+    ]
+    now = time.time()
+
+    for round_num in range(rounds):
+        start = time.perf_counter()
+        for key in keys:
+            store.hit_sync(key, WINDOW_IN_SECS, REQUESTS_LIMIT, PENALTY_IN_SECS, now)
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Round {round_num + 1}: {clients} hits in {elapsed:.3f}s, "
+            f"{elapsed / clients * 1e6:.2f} us/hit, {len(store)} keys"
+        )
+        now += 1
+
+    # Every client idle past its expiry, the wheel drops them all
+    start = time.perf_counter()
+    store.hit_sync(
+        "late:/reader", WINDOW_IN_SECS, REQUESTS_LIMIT, PENALTY_IN_SECS, now + 3600
+    )
+    logger.info(
+        f"Expiry sweep: {time.perf_counter() - start:.3f}s, {len(store)} keys left"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    run(args.clients, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark of the page renderer against the former pdf2image path.
+
+    python -m scripts.bench_render [--pages 100] [--dpi 72]
+
+Run from the app folder. The pdf2image side needs pdf2image and the
+poppler utils, which the API no longer installs.
+"""
+import io
+import time
+import shutil
+import argparse
+import fitz
+import logging
+
+try:
+    from pdf2image import convert_from_bytes
+except ImportError:  # Dropped from requirements.txt
+    convert_from_bytes = None
+
+
+# Create Logger
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s:%(message)s")
+
+# Synthetic Booklet Settings
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+LINES_PER_PAGE = 20
+
+
+def build_pdf(pages: int) -> bytes:
+    """
+    Booklet like PDF, a title, a picture made of shapes and a text block
+    per page
+    """
+    doc = fitz.open()
+    for page_num in range(1, pages + 1):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        page.insert_text((72, 72), f"Capitulo {page_num}", fontsize=24)
+        for shape in range(6):
+            rect = fitz.Rect(72 + shape * 70, 110, 132 + shape * 70, 330)
+            color = ((shape * 40 % 255) / 255, (page_num * 7 % 255) / 255, 0.5)
+            page.draw_rect(rect, color=color, fill=color)
+        text = " ".join(["Habia una vez un libro de cuentos."] * 2)
+        for line in range(LINES_PER_PAGE):
+            page.insert_text((72, 370 + line * 20), text, fontsize=11)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def render_mupdf(data: bytes, pages: int, dpi: int) -> int:
+    """
+    Current path, one Document and a PNG per page straight from the pixmap
+    """
+    total = 0
+    doc = fitz.open("pdf", data)
+    for page_num in range(1, pages + 1):
+        pixmap = doc[page_num - 1].get_pixmap(dpi=dpi)
+        total += len(io.BytesIO(pixmap.tobytes("png")).getvalue())
+    doc.close()
+    return total
+
+
+def render_pdf2image(data: bytes, pages: int, dpi: int) -> int:
+    """
+    Former path, one pdftoppm run for the whole document, then a PIL
+    round trip per page
+    """
+    total = 0
+    for image in convert_from_bytes(data, dpi=dpi):
+        img_bytes = io.BytesIO()
+        image.save(img_bytes, "PNG")
+        total += len(img_bytes.getvalue())
+    return total
+
+
+def bench(name: str, render, data: bytes, pages: int, dpi: int) -> float:
+    start = time.perf_counter()
+    total = render(data, pages, dpi)
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"{name}: {pages} pages in {elapsed:.2f}s, "
+        f"{elapsed / pages * 1000:.1f} ms/page, {total / 1024:.0f} KiB of PNG"
+    )
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--dpi", type=int, default=72)
+    args = parser.parse_args()
+
+    data = build_pdf(args.pages)
+    logger.info(f"Synthetic PDF: {args.pages} pages, {len(data) / 1024:.0f} KiB")
+
+    mupdf = bench("PyMuPDF", render_mupdf, data, args.pages, args.dpi)
+    if convert_from_bytes is None or shutil.which("pdftoppm") is None:
+        logger.warning("pdf2image or poppler missing, only PyMuPDF was measured")
+        return
+    pdf2image = bench("pdf2image", render_pdf2image, data, args.pages, args.dpi)
+    logger.info(f"PyMuPDF is {pdf2image / mupdf:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
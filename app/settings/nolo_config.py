@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 import logging
 
@@ -44,9 +45,14 @@ class NoloCFG:
         self.openai_max_tkn = os.getenv("OPENAI_PROMPT_MAX_TKN")
         self.openai_min_lines = os.getenv("OPENAI_PROMPT_MIN_LINES")
         self.openai_model = "gpt-4-vision-preview" or os.getenv("OPENAI_MODEL")
-        self.logs_cfg = logging.basicConfig(
-            level=logging.INFO, format="%(asctime)s %(levelname)s:%(message)s"
-        )
 
         # inform
         logger.info("Nolo APP Config in Use", extra={"data": self})
+
+
+@lru_cache(maxsize=None)
+def get_config() -> NoloCFG:
+    """
+    Process wide NoloCFG, every module shares the same instance
+    """
+    return NoloCFG()
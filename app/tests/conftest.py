@@ -0,0 +1,52 @@
+import os
+import sys
+import json
+import pytest
+import tempfile
+
+# Test settings, no request ever leaves the process
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = tempfile.mkdtemp(prefix="nolo-tests-")
+sys.path.insert(0, APP_DIR)
+os.environ.update(
+    {
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "BUCKET_NAME": "nolo-bucket",
+        "API_DDB_TABLE_NAME": "nolo-booklets",
+        "API_DDB_PAGES_TABLE_NAME": "nolo-booklet-pages",
+        "USER_DDB_TABLE_NAME": "nolo-users",
+        "JWT_ALGORITHM": "HS256",
+        "JWT_TOKEN_EXPIRES_MIN": "30",
+        "JWT_TOKEN_REFRESH_MIN": "60",
+        "JOB_DB_PATH": os.path.join(DATA_DIR, "jobs.db"),
+        "UPLOAD_PATH": os.path.join(DATA_DIR, "uploads"),
+        "AI_CACHE_PATH": os.path.join(DATA_DIR, "ai_desc_cache.json"),
+    }
+)
+
+from moto import mock_aws  # noqa: E402, patches botocore before any client
+
+TABLE_DEFINITIONS = {
+    "API_DDB_TABLE_NAME": "booklet_table.json",
+    "API_DDB_PAGES_TABLE_NAME": "booklet_pages_table.json",
+}
+
+
+@pytest.fixture
+def aws():
+    """
+    Local DynamoDB tables and S3 bucket, created from scripts/*.json
+    """
+    with mock_aws():
+        from handlers.aws_handler import aws_clients
+
+        client = aws_clients.client("dynamodb")
+        for env_name, file_name in TABLE_DEFINITIONS.items():
+            with open(os.path.join(APP_DIR, "scripts", file_name)) as f:
+                definition = json.load(f)
+            definition["TableName"] = os.environ[env_name]
+            client.create_table(**definition)
+        aws_clients.client("s3").create_bucket(Bucket=os.environ["BUCKET_NAME"])
+        yield aws_clients
@@ -0,0 +1,41 @@
+import json
+import threading
+from handlers.ai_handler import NoloAIDescriptionCache
+
+
+def saved_hashes(path) -> list:
+    with open(path, encoding="utf-8") as f:
+        return sorted(int(img_hash, 16) for img_hash, *_ in json.load(f))
+
+
+def test_put_saves_every_few_descriptions(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = NoloAIDescriptionCache(path=str(path), save_every=3)
+
+    cache.put(1, "es", "uno")
+    cache.put(2, "es", "dos")
+    assert not path.exists()
+
+    cache.put(3, "es", "tres")
+    cache.put(4, "es", "cuatro")
+    assert saved_hashes(path) == [1, 2, 3]
+
+    cache.flush()
+    assert saved_hashes(path) == [1, 2, 3, 4]
+    assert NoloAIDescriptionCache(path=str(path)).get(4, "es") == "cuatro"
+
+
+def test_concurrent_puts_keep_every_description(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = NoloAIDescriptionCache(path=str(path), max_distance=0, save_every=1)
+
+    threads = [
+        threading.Thread(target=cache.put, args=(num, "es", f"page {num}"))
+        for num in range(1, 33)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert saved_hashes(path) == list(range(1, 33))
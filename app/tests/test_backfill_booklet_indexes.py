@@ -0,0 +1,49 @@
+import pytest
+from handlers.db_handler import NoloDBHandler, PUBLISHED_SHELF
+from scripts.backfill_booklet_indexes import backfill_index_keys
+
+
+@pytest.fixture
+def db(aws):
+    db = NoloDBHandler()
+    table = db.get_table()
+    table.put_item(Item={"doc_id": "legacy", "is_published": True, "created_at": 1})
+    table.put_item(
+        Item={
+            "doc_id": "toggled",
+            "is_published": True,
+            "modify_at": 2,
+            "update_counter": 5,
+        }
+    )
+    return db
+
+
+def test_backfill_sets_the_index_keys(db):
+    assert backfill_index_keys(db, dry_run=False) == 2
+
+    item = db.get_table().get_item(Key={"doc_id": "legacy"})["Item"]
+    assert item["published_shelf"] == PUBLISHED_SHELF
+    assert item["modify_at"] == 1
+    assert item["update_counter"] == 1
+
+
+def test_backfill_skips_booklets_toggled_after_the_scan(db, monkeypatch):
+    scan_all = db.scan_all
+
+    def scan_then_unpublish(projection):
+        items = scan_all(projection)
+        # The publish route toggles the booklet off meanwhile
+        db.get_table().update_item(
+            Key={"doc_id": "toggled"},
+            UpdateExpression="SET is_published = :off, update_counter = :counter",
+            ExpressionAttributeValues={":off": False, ":counter": 6},
+        )
+        return items
+
+    monkeypatch.setattr(db, "scan_all", scan_then_unpublish)
+
+    assert backfill_index_keys(db, dry_run=False) == 1
+    item = db.get_table().get_item(Key={"doc_id": "toggled"})["Item"]
+    assert "published_shelf" not in item
+    assert item["update_counter"] == 6
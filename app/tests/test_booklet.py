@@ -0,0 +1,121 @@
+import io
+import asyncio
+import threading
+import pytest
+from fastapi import BackgroundTasks, HTTPException, UploadFile
+from starlette.datastructures import Headers
+from router import booklet
+from models.iam_model import User
+from models.rdr_model import BookletEdit
+
+DOC_ID = "doc01"
+USER = User(username="alice")
+
+
+@pytest.fixture
+def stored(aws):
+    booklet.db.get_table().put_item(
+        Item={
+            "doc_id": DOC_ID,
+            "doc_name": DOC_ID,
+            "doc_title": "Cuentos",
+            "owner_id": "alice",
+            "update_counter": 3,
+        }
+    )
+    booklet.db.put_pages(
+        DOC_ID,
+        [
+            {"page_num": num, "elements": {"text": f"page {num}"}, "create_tts": False}
+            for num in range(1, 4)
+        ],
+    )
+    return booklet.db
+
+
+def patch(edit: dict):
+    tasks = BackgroundTasks()
+    asyncio.run(
+        booklet.update_one_booklet(DOC_ID, BookletEdit(**edit), tasks, user=USER)
+    )
+    return tasks
+
+
+def text_edit(page_num: int, text: str) -> dict:
+    return {"pages": [{"page_num": page_num, "elements": {"text": text}}]}
+
+
+def test_patch_writes_header_and_pages_together(stored):
+    tasks = patch({"doc_title": "Fabulas", **text_edit(2, "new text")})
+
+    header = stored.get_table().get_item(Key={"doc_id": DOC_ID})["Item"]
+    page = stored.get_pages_by_num(DOC_ID, [2])[0]
+    assert header["doc_title"] == "Fabulas"
+    assert header["update_counter"] == 4
+    assert page["elements"]["text"] == "new text"
+    assert page["update_counter"] == 1
+    changed_pages = tasks.tasks[0].args[2]
+    assert changed_pages[0]["update_counter"] == page["update_counter"]
+
+
+def test_conflict_leaves_pages_untouched(stored, monkeypatch):
+    get_item = stored.async_get_item
+
+    async def stale_get_item(*args, **kwargs):
+        item = await get_item(*args, **kwargs)
+        # Another PATCH commits between this read and the write
+        stored.get_table().update_item(
+            Key={"doc_id": DOC_ID},
+            UpdateExpression="SET update_counter = :counter",
+            ExpressionAttributeValues={":counter": 4},
+        )
+        return item
+
+    monkeypatch.setattr(stored, "async_get_item", stale_get_item)
+
+    with pytest.raises(HTTPException) as error:
+        patch(text_edit(2, "new text"))
+
+    assert error.value.status_code == 409
+    page = stored.get_pages_by_num(DOC_ID, [2])[0]
+    assert page["elements"]["text"] == "page 2"
+    assert "update_counter" not in page
+
+    # The retry still sees the edit as a change
+    monkeypatch.setattr(stored, "async_get_item", get_item)
+    tasks = patch(text_edit(2, "new text"))
+    assert len(tasks.tasks[0].args[2]) == 1
+
+
+def test_too_many_pages_are_rejected(stored):
+    pages = [
+        {"page_num": num, "elements": {"text": "edit"}}
+        for num in range(1, booklet.MAX_TRANSACT_ITEMS + 1)
+    ]
+    stored.put_pages(DOC_ID, [{**page, "create_tts": False} for page in pages])
+    with pytest.raises(HTTPException) as error:
+        patch({"pages": [{**page, "elements": {"text": "x"}} for page in pages]})
+
+    assert error.value.status_code == 400
+
+
+def test_upload_is_written_off_the_event_loop(aws, monkeypatch):
+    threads = []
+    save_upload = booklet.save_upload
+
+    def recorded_save_upload(upload, file_path):
+        threads.append(threading.current_thread())
+        return save_upload(upload, file_path)
+
+    monkeypatch.setattr(booklet, "save_upload", recorded_save_upload)
+    upload = UploadFile(
+        io.BytesIO(b"%PDF-1.4 booklet"),
+        filename="cuentos.pdf",
+        headers=Headers({"content-type": "application/pdf"}),
+    )
+
+    job = asyncio.run(booklet.upload_file(upload, "Cuentos", None, user=USER))
+
+    assert threads and threads[0] is not threading.main_thread()
+    with open(booklet.job_queue.get_job(job["job_id"])["file_path"], "rb") as f:
+        assert f.read() == b"%PDF-1.4 booklet"
@@ -0,0 +1,236 @@
+import asyncio
+import pytest
+from botocore.exceptions import ClientError
+from handlers.db_handler import (
+    NoloDBHandler,
+    OWNER_INDEX_NAME,
+    encode_cursor,
+    decode_cursor,
+    update_item_and_counter,
+    is_version_conflict,
+)
+
+PROJECTION = "doc_id, owner_id, modify_at"
+
+
+@pytest.fixture
+def db(aws):
+    db = NoloDBHandler()
+    table = db.get_table()
+    for num in range(23):
+        table.put_item(
+            Item={
+                "doc_id": f"doc{num:02}",
+                "owner_id": "alice" if num % 2 else "bob",
+                "modify_at": 1700000000 + num,
+            }
+        )
+    return db
+
+
+def scan_pages(db, limit):
+    pages, cursor = [], None
+    while True:
+        items, cursor = db.scan_page(PROJECTION, limit, cursor=cursor)
+        pages.append(items)
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("limit", [1, 3, 5, 25])
+def test_scan_page_never_exceeds_limit(db, limit):
+    pages = scan_pages(db, limit)
+    doc_ids = [item["doc_id"] for items in pages for item in items]
+
+    assert all(len(items) <= limit for items in pages)
+    assert sorted(doc_ids) == [f"doc{num:02}" for num in range(23)]
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        encode_cursor([{"owner_id": "bob"}, None, None, None]),
+        encode_cursor([{"doc_id": ["doc01"]}, None, None, None]),
+        encode_cursor(["doc01", None, None, None]),
+        encode_cursor([None, None]),
+        "not a cursor",
+    ],
+)
+def test_scan_page_rejects_bad_cursors(db, cursor):
+    with pytest.raises(ValueError):
+        db.scan_page(PROJECTION, 5, cursor=cursor)
+
+
+def test_query_index_pages_newest_first(db):
+    items, cursor = db.query_index(OWNER_INDEX_NAME, "owner_id", "alice", 4)
+    more, _ = db.query_index(OWNER_INDEX_NAME, "owner_id", "alice", 4, cursor)
+
+    modify_at = [item["modify_at"] for item in items + more]
+    assert modify_at == sorted(modify_at, reverse=True)
+    assert len(set(item["doc_id"] for item in items + more)) == 8
+    assert decode_cursor(cursor)["owner_id"] == "alice"
+
+
+@pytest.mark.parametrize(
+    "start_key",
+    [
+        {"owner_id": "alice"},
+        {"owner_id": "alice", "doc_id": 1.5},
+        {"owner_id": "alice", "modify_at": "yesterday", "doc_id": "doc01"},
+    ],
+)
+def test_query_index_rejects_bad_cursors(db, start_key):
+    with pytest.raises(ValueError):
+        db.query_index(
+            OWNER_INDEX_NAME, "owner_id", "alice", 4, encode_cursor(start_key)
+        )
+
+
+def test_put_pages_drops_pages_of_a_longer_version(aws):
+    db = NoloDBHandler()
+    db.put_pages("doc", [{"page_num": num, "elements": {}} for num in range(1, 8)])
+    db.put_pages("doc", [{"page_num": num, "elements": {}} for num in range(1, 4)])
+
+    assert [page["page_num"] for page in db.get_pages("doc")] == [1, 2, 3]
+    assert db.get_pages("doc", first_page=4) == []
+
+
+# Async API and the page table
+BIG_TEXT = "x" * 40_000  # 40 pages go past the 1 MB page of a query
+
+
+def make_pages(count: int, text: str = "text") -> list:
+    return [
+        {"page_num": num, "elements": {"text": text}} for num in range(1, count + 1)
+    ]
+
+
+@pytest.fixture
+def counted_queries(monkeypatch):
+    """
+    Number of query calls made on the pages table
+    """
+    calls = []
+    table = NoloDBHandler().get_pages_table()
+    query = table.query
+
+    def counted_query(**kwargs):
+        calls.append(kwargs)
+        return query(**kwargs)
+
+    monkeypatch.setattr(NoloDBHandler, "get_pages_table", lambda self: table)
+    monkeypatch.setattr(table, "query", counted_query)
+    return calls
+
+
+def test_async_item_round_trip(aws):
+    db = NoloDBHandler()
+    item = {"doc_id": "doc", "doc_title": "Cuentos", "owner_id": "alice"}
+
+    async def run():
+        await db.async_put_item(item)
+        stored = await db.async_get_item({"doc_id": "doc"}, "doc_id, doc_title")
+        await db.async_delete_item({"doc_id": "doc"})
+        return stored, await db.async_get_item({"doc_id": "doc"})
+
+    stored, deleted = asyncio.run(run())
+    assert stored == {"doc_id": "doc", "doc_title": "Cuentos"}
+    assert deleted is None
+
+
+@pytest.mark.parametrize(
+    "first_page, last_page, expected",
+    [(None, None, range(1, 11)), (3, 5, range(3, 6)), (8, None, range(8, 11))],
+)
+def test_async_get_pages_windows(aws, first_page, last_page, expected):
+    db = NoloDBHandler()
+    db.put_pages("doc", make_pages(10))
+
+    pages = asyncio.run(db.async_get_pages("doc", first_page, last_page))
+    assert [page["page_num"] for page in pages] == list(expected)
+
+
+def test_get_pages_follows_the_query_pages(aws, counted_queries):
+    db = NoloDBHandler()
+    db.put_pages("doc", make_pages(40, BIG_TEXT))
+    counted_queries.clear()
+
+    pages = asyncio.run(db.async_get_pages("doc"))
+    assert [page["page_num"] for page in pages] == list(range(1, 41))
+    assert len(counted_queries) > 1
+
+
+def test_async_get_pages_by_num_spans_batches(aws):
+    db = NoloDBHandler()
+    db.put_pages("doc", make_pages(150))
+
+    wanted = [150, *range(1, 120, 3), 2, 2]
+    pages = asyncio.run(db.async_get_pages_by_num("doc", wanted))
+    assert [page["page_num"] for page in pages] == sorted(set(wanted))
+
+
+def test_async_delete_pages_is_paginated(aws, counted_queries):
+    db = NoloDBHandler()
+    db.put_pages("doc", make_pages(40, BIG_TEXT))
+    db.put_pages("other", make_pages(2))
+    counted_queries.clear()
+
+    deleted = asyncio.run(db.async_delete_pages("doc"))
+    assert deleted == 40
+    assert len(counted_queries) > 1
+    assert db.get_pages("doc") == []
+    assert len(db.get_pages("other")) == 2
+
+
+def test_async_query_index_walks_every_cursor(db):
+    async def walk():
+        items, cursor = [], None
+        while True:
+            page, cursor = await db.async_query_index(
+                OWNER_INDEX_NAME, "owner_id", "bob", 5, cursor
+            )
+            items.extend(page)
+            if cursor is None:
+                return items
+
+    items = asyncio.run(walk())
+    assert sorted(item["doc_id"] for item in items) == [
+        f"doc{num:02}" for num in range(0, 23, 2)
+    ]
+
+
+def test_async_scan_page_walks_every_cursor(db):
+    async def walk():
+        items, cursor = [], None
+        while True:
+            page, cursor = await db.async_scan_page(PROJECTION, 7, cursor)
+            items.extend(page)
+            if cursor is None:
+                return items
+
+    items = asyncio.run(walk())
+    assert sorted(item["doc_id"] for item in items) == [
+        f"doc{num:02}" for num in range(23)
+    ]
+
+
+def test_update_item_and_counter_detects_version_conflicts(db):
+    table = db.get_table()
+    key = {"doc_id": "doc01"}
+
+    # Items written before update_counter existed expect None
+    response = update_item_and_counter(table, key, {"doc_title": "A"}, None)
+    assert response["Attributes"]["update_counter"] == 1
+    response = update_item_and_counter(table, key, {"doc_title": "B"}, 1)
+    assert response["Attributes"]["update_counter"] == 2
+
+    for expected_counter in (1, None):
+        with pytest.raises(ClientError) as error:
+            update_item_and_counter(table, key, {"doc_title": "C"}, expected_counter)
+        assert is_version_conflict(error.value)
+
+    # Missing items are a conflict too, never an upsert
+    with pytest.raises(ClientError) as error:
+        update_item_and_counter(table, {"doc_id": "missing"}, {}, None)
+    assert is_version_conflict(error.value)
+    assert "Item" not in table.get_item(Key={"doc_id": "missing"})
@@ -0,0 +1,20 @@
+import asyncio
+import pytest
+from utils.io_pool import NoloIOPool
+
+
+def test_run_counts_calls_and_errors():
+    pool = NoloIOPool(max_workers=2)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    async def run():
+        assert await pool.run(sum, [1, 2], start=3) == 6
+        with pytest.raises(RuntimeError):
+            await pool.run(fail)
+
+    asyncio.run(run())
+    stats = pool.stats()
+    assert (stats["calls"], stats["errors"], stats["inflight"]) == (2, 1, 0)
+    assert stats["max_inflight"] == 1
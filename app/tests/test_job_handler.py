@@ -0,0 +1,82 @@
+import time
+import sqlite3
+import asyncio
+import pytest
+from handlers import job_handler
+from handlers.job_handler import NoloJobQueue, NoloIngestWorker, JOB_RUNNING
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return NoloJobQueue(db_path=str(tmp_path / "jobs.db"))
+
+
+def enqueue(queue: NoloJobQueue) -> dict:
+    return queue.enqueue("/tmp/doc.pdf", "doc.pdf", "Cuentos", None, "alice")
+
+
+def go_stale(queue: NoloJobQueue, job: dict):
+    stale_at = int(time.time()) - job_handler.JOB_STALE_AFTER_IN_SECS - 1
+    queue.conn.execute(
+        "UPDATE jobs SET modify_at = ? WHERE job_id = ?", (stale_at, job["job_id"])
+    )
+
+
+def test_stale_job_is_reclaimed_and_the_old_claim_dropped(queue):
+    enqueue(queue)
+    first = queue.claim_next()
+    go_stale(queue, first)
+    second = queue.claim_next()
+
+    assert second["job_id"] == first["job_id"]
+    assert second["claim_id"] != first["claim_id"]
+    assert not queue.page_done(first, 1)
+    assert not queue.complete(first)
+    assert not queue.fail(first, "late failure")
+    assert queue.get_job(first["job_id"])["status"] == JOB_RUNNING
+
+    assert queue.page_done(second, 1)
+    assert queue.complete(second, {"text": 1})
+    assert queue.get_job(second["job_id"])["status"] == job_handler.JOB_DONE
+
+
+def test_heartbeat_keeps_a_long_page_claimed(queue):
+    enqueue(queue)
+    job = queue.claim_next()
+    go_stale(queue, job)
+
+    assert queue.heartbeat(job)
+    assert queue.claim_next() is None
+
+
+def test_worker_heartbeats_while_processing(queue, monkeypatch):
+    monkeypatch.setattr(job_handler, "JOB_HEARTBEAT_INTERVAL_IN_SECS", 0.01)
+    enqueue(queue)
+    job = queue.claim_next()
+    worker = NoloIngestWorker(queue, db=None)
+    beats = []
+    heartbeat = queue.heartbeat
+
+    def counted_heartbeat(job):
+        beats.append(job["job_id"])
+        return heartbeat(job)
+
+    async def long_page(job):
+        await asyncio.sleep(0.1)
+
+    monkeypatch.setattr(queue, "heartbeat", counted_heartbeat)
+    monkeypatch.setattr(worker, "_process", long_page)
+    asyncio.run(worker.process(job))
+
+    assert len(beats) >= 3
+
+
+def test_queue_created_before_claims_is_migrated(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    conn = sqlite3.connect(path)
+    conn.execute(job_handler.CREATE_JOBS_TABLE.replace("    claim_id TEXT,\n", ""))
+    conn.close()
+
+    queue = NoloJobQueue(db_path=path)
+    enqueue(queue)
+    assert queue.claim_next()["claim_id"]
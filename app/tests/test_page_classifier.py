@@ -0,0 +1,33 @@
+import fitz
+from utils.page_classifier import (
+    NoloPageClassifier,
+    BLANK_MAX_INK,
+    PAGE_BLANK,
+    PAGE_TEXT_ONLY,
+)
+
+
+def doc_with_a_dot():
+    doc = fitz.open()
+    page = doc.new_page(width=200, height=200)
+    page.draw_rect(fitz.Rect(10, 10, 12, 12), color=(0, 0, 0), fill=(0, 0, 0))
+    return doc
+
+
+def test_zero_thresholds_are_kept():
+    classifier = NoloPageClassifier(0, 0.0, 0, 0)
+
+    assert classifier.blank_max_ink == 0
+    assert classifier.text_only_max_ink == 0.0
+    assert classifier.text_only_max_color == 0
+    assert classifier.text_only_max_drawings == 0
+    assert NoloPageClassifier().blank_max_ink == BLANK_MAX_INK
+
+
+def test_zero_blank_threshold_only_skips_empty_pages():
+    doc = doc_with_a_dot()
+    page = doc[0]
+    pixmap = page.get_pixmap(dpi=72)
+
+    assert NoloPageClassifier().classify(page, pixmap) == PAGE_BLANK
+    assert NoloPageClassifier(blank_max_ink=0).classify(page, pixmap) == PAGE_TEXT_ONLY
@@ -0,0 +1,63 @@
+import asyncio
+import pytest
+import fakeredis
+from handlers import ral_handler
+from handlers.ral_handler import NoloMemoryRateLimitStore, NoloRedisRateLimitStore
+
+
+class DownRedis(fakeredis.aioredis.FakeRedis):
+    """
+    Redis client whose server never answers
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def register_script(self, script):
+        async def call(keys, args):
+            self.calls += 1
+            raise ConnectionError("Timeout connecting to server")
+
+        return call
+
+
+def hits(store, count: int, limit: int = 3) -> list:
+    async def run():
+        return [await store.hit("ip:/path", 60, limit, 300) for _ in range(count)]
+
+    return asyncio.run(run())
+
+
+def test_redis_store_shares_the_sliding_window():
+    client = fakeredis.aioredis.FakeRedis()
+    first = NoloRedisRateLimitStore(None, client=client)
+    second = NoloRedisRateLimitStore(None, client=client)
+
+    assert hits(first, 2) == [True, True]
+    assert hits(second, 2) == [True, False]
+
+
+def test_unreachable_redis_is_retried_after_the_backoff(monkeypatch):
+    client = DownRedis()
+    store = NoloRedisRateLimitStore(
+        None, fallback=NoloMemoryRateLimitStore(), client=client
+    )
+
+    assert hits(store, 4) == [True, True, True, False]
+    assert client.calls == 1
+
+    monkeypatch.setattr(store, "retry_at", 0.0)
+    hits(store, 1)
+    assert client.calls == 2
+
+
+def test_redis_client_has_short_timeouts():
+    pytest.importorskip("redis")
+    store = NoloRedisRateLimitStore("redis://localhost:6379/0")
+    kwargs = store.client.connection_pool.connection_kwargs
+
+    assert kwargs["socket_timeout"] == ral_handler.RATE_LIMIT_REDIS_TIMEOUT_IN_SECS
+    assert (
+        kwargs["socket_connect_timeout"] == ral_handler.RATE_LIMIT_REDIS_TIMEOUT_IN_SECS
+    )
@@ -0,0 +1,109 @@
+import os
+import asyncio
+import types
+import datetime
+import pytest
+import botocore.auth
+from handlers.s3_handler import NoloBlobAPI, NoloBulkPresigner, presign_cache
+
+FROZEN_NOW = datetime.datetime(2024, 5, 1, 12, 0, 0)
+KEYS = [
+    "img/abc12345/abc12345_page_01.png",
+    "img/abc12345/page 01 cover.png",
+    "tts/abc12345/a+b=c.mp3",
+    "txt/abc12345/~draft~.txt",
+    "img/abc12345/canción ñandú é.png",
+    "img/abc12345/日本語.png",
+]
+
+
+@pytest.fixture
+def frozen_clock(monkeypatch):
+    """
+    boto3 and the bulk presigner sign with the same timestamp
+    """
+    if hasattr(botocore.auth, "get_current_datetime"):
+        monkeypatch.setattr(botocore.auth, "get_current_datetime", lambda: FROZEN_NOW)
+    else:
+
+        class FrozenDatetime(datetime.datetime):
+            @classmethod
+            def utcnow(cls):
+                return FROZEN_NOW
+
+        monkeypatch.setattr(
+            botocore.auth, "datetime", types.SimpleNamespace(datetime=FrozenDatetime)
+        )
+
+
+@pytest.fixture
+def blob(frozen_clock):
+    presign_cache.clear()
+    yield NoloBlobAPI()
+    presign_cache.clear()
+
+
+def boto3_url(blob, filename, expires=3600):
+    return blob.bucket.generate_presigned_url(
+        ClientMethod="get_object",
+        ExpiresIn=expires,
+        Params={"Bucket": blob.bucket_name, "Key": filename},
+    )
+
+
+def test_presign_many_matches_boto3(blob):
+    urls = blob.presign_many(KEYS)
+
+    assert list(urls) == KEYS
+    assert "X-Amz-Date=20240501T120000Z" in urls[KEYS[0]]
+    for filename in KEYS:
+        assert urls[filename] == boto3_url(blob, filename)
+
+
+def test_presign_many_uses_the_bulk_presigner(blob, monkeypatch):
+    calls = []
+    generate = blob.bucket.generate_presigned_url
+
+    def counted_generate(**kwargs):
+        calls.append(kwargs)
+        return generate(**kwargs)
+
+    monkeypatch.setattr(blob.bucket, "generate_presigned_url", counted_generate)
+
+    blob.presign_many(KEYS, expires=900)
+
+    # Only the template URL is signed by boto3
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("filename", KEYS)
+def test_bulk_presigner_matches_boto3(blob, filename):
+    template = KEYS[0]
+    presigner = NoloBulkPresigner(
+        boto3_url(blob, template), template, os.environ["AWS_SECRET_ACCESS_KEY"]
+    )
+
+    assert presigner.is_valid()
+    assert presigner.presign(filename) == boto3_url(blob, filename)
+
+
+def test_generate_presigned_url_is_cached(blob):
+    url = blob.generate_presigned_url(KEYS[1])
+
+    assert url == boto3_url(blob, KEYS[1])
+    assert blob.presign_many([KEYS[1]]) == {KEYS[1]: url}
+
+
+def test_async_delete_booklet_assets_is_paginated(aws):
+    blob = NoloBlobAPI()
+    client = aws.client("s3")
+    keys = [f"img/doc01/doc01_page_{num:04}.png" for num in range(1, 1101)]
+    keys += ["txt/doc01/doc01_page_0001.txt", "tts/doc01/doc01_page_0001.mp3"]
+    kept = ["img/doc02/doc02_page_0001.png", "img/doc010/doc010_page_0001.png"]
+    for key in keys + kept:
+        client.put_object(Bucket=blob.bucket_name, Key=key, Body=b"")
+
+    assert asyncio.run(blob.async_delete_booklet_assets("doc01"))
+
+    listing = client.list_objects_v2(Bucket=blob.bucket_name)
+    assert sorted(item["Key"] for item in listing["Contents"]) == sorted(kept)
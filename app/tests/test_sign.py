@@ -0,0 +1,51 @@
+import os
+import asyncio
+import pytest
+from handlers.tkn_handler import stop_hash_pool
+from handlers.db_handler import user_cache
+from router import sign
+
+
+@pytest.fixture
+def users(aws):
+    """
+    Users table keyed by username, it has no scripts/*.json definition
+    """
+    aws.client("dynamodb").create_table(
+        TableName=os.environ["USER_DDB_TABLE_NAME"],
+        KeySchema=[{"AttributeName": "username", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "username", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    user_cache.clear()
+    yield sign.user_db
+    user_cache.clear()
+    stop_hash_pool()
+
+
+def sign_up(username: str) -> dict:
+    return asyncio.run(
+        sign.sign_up(
+            username=username,
+            password="secret-password",
+            full_name="Alice Doe",
+            email="alice@example.org",
+        )
+    )
+
+
+def test_sign_up_stores_the_new_user(users):
+    new_user = sign_up("alice")
+
+    stored = users.get_one_user("alice")
+    assert new_user["username"] == stored.username == "alice"
+    assert stored.disabled
+    assert sign.tkn.verify_password("secret-password", stored.hashed_password)
+
+
+def test_sign_up_keeps_an_existing_user(users):
+    sign_up("alice")
+    hashed_password = users.get_one_user("alice").hashed_password
+
+    assert sign_up("alice") is None
+    assert users.get_one_user("alice").hashed_password == hashed_password
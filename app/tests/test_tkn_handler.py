@@ -0,0 +1,42 @@
+import os
+import signal
+import asyncio
+import pytest
+from fastapi import HTTPException
+from handlers import tkn_handler
+from handlers.tkn_handler import NoloToken, start_hash_pool, stop_hash_pool
+
+PASSWORD = "secret-password"
+
+
+@pytest.fixture
+def iam(monkeypatch):
+    monkeypatch.setenv("JWT_ALGORITHM", "HS256")
+    monkeypatch.setenv("JWT_TOKEN_EXPIRES_MIN", "30")
+    monkeypatch.setenv("JWT_TOKEN_REFRESH_MIN", "60")
+    start_hash_pool()
+    yield NoloToken()
+    stop_hash_pool()
+
+
+def test_pool_workers_do_not_fork_the_api_process(iam):
+    assert tkn_handler.hash_pool._mp_context.get_start_method() == "forkserver"
+    assert len(tkn_handler.hash_pool._processes) == tkn_handler.BCRYPT_MAX_WORKERS
+
+
+def test_broken_pool_is_restarted(iam):
+    hashed = iam.get_password_hash(PASSWORD)
+    broken = tkn_handler.hash_pool
+    os.kill(next(iter(broken._processes)), signal.SIGKILL)
+
+    assert asyncio.run(iam.async_verify_password(PASSWORD, hashed))
+    assert tkn_handler.hash_pool is not broken
+
+
+def test_saturated_pool_sheds_logins(iam, monkeypatch):
+    monkeypatch.setattr(NoloToken, "hash_inflight", tkn_handler.BCRYPT_MAX_QUEUE)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(iam.async_verify_password(PASSWORD, "hash"))
+
+    assert error.value.status_code == 503
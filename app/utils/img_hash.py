@@ -0,0 +1,55 @@
+import numpy as np
+import logging
+
+
+# Hash Settings
+HASH_SIZE = 8  # 8x8 gradients -> 64 bits hash
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+# Logger
+logger = logging.getLogger(__name__)
+
+
+def pixmap_to_gray(pixmap) -> np.ndarray:
+    """
+    View a PyMuPDF Pixmap as a 2D float32 grayscale array
+    """
+    samples = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(
+        pixmap.height, pixmap.width, pixmap.n
+    )
+    if pixmap.n >= 3:
+        return samples[..., :3].astype(np.float32) @ LUMA_WEIGHTS
+    return samples[..., 0].astype(np.float32)
+
+
+def _block_means(gray: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    """
+    Downscale by averaging rows x cols blocks
+    """
+    height, width = gray.shape
+    row_edges = np.linspace(0, height, rows + 1).astype(int)
+    col_edges = np.linspace(0, width, cols + 1).astype(int)
+    sums = np.add.reduceat(
+        np.add.reduceat(gray, row_edges[:-1], axis=0), col_edges[:-1], axis=1
+    )
+    areas = np.outer(
+        np.maximum(np.diff(row_edges), 1), np.maximum(np.diff(col_edges), 1)
+    )
+    return sums / areas
+
+
+def dhash(gray: np.ndarray, hash_size: int = HASH_SIZE) -> int:
+    """
+    Difference hash: sign of the horizontal gradient of a tiny thumbnail
+    """
+    thumb = _block_means(gray, hash_size, hash_size + 1)
+    bits = thumb[:, 1:] > thumb[:, :-1]
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def hamming_distances(hashes: np.ndarray, img_hash: int) -> np.ndarray:
+    """
+    Bit distance between img_hash and every uint64 hash in hashes
+    """
+    xored = np.bitwise_xor(hashes.astype(np.uint64), np.uint64(img_hash))
+    return np.unpackbits(xored.view(np.uint8)).reshape(-1, 64).sum(axis=1)
@@ -0,0 +1,95 @@
+import os
+import time
+import asyncio
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+
+# Logger
+logger = logging.getLogger(__name__)
+
+# I/O Pool Settings
+IO_MAX_WORKERS = int(os.getenv("IO_MAX_WORKERS", "32"))
+IO_SLOW_CALL_IN_SECS = float(os.getenv("IO_SLOW_CALL_IN_SECS", "1"))
+
+
+class NoloIOPool:
+    """
+    Dedicated thread pool for blocking AWS calls made from async routes,
+    with in flight, queue wait and slow call counters
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or IO_MAX_WORKERS
+        self.pool = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="nolo-io"
+        )
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.slow_calls = 0
+        self.inflight = 0
+        self.max_inflight = 0
+        self.wait_time = 0.0
+        self.run_time = 0.0
+
+    def _timed(self, func, submitted_at: float):
+        started_at = time.perf_counter()
+        try:
+            return func()
+        except Exception:
+            with self.lock:
+                self.errors += 1
+            raise
+        finally:
+            ended_at = time.perf_counter()
+            with self.lock:
+                self.wait_time += started_at - submitted_at
+                self.run_time += ended_at - started_at
+                if ended_at - started_at >= IO_SLOW_CALL_IN_SECS:
+                    self.slow_calls += 1
+                    logger.warning(
+                        f"Slow I/O call {getattr(func, 'func', func).__qualname__}"
+                        f" took {ended_at - started_at:.2f}s"
+                    )
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Await a blocking call on the I/O pool
+        """
+        with self.lock:
+            self.calls += 1
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            loop = asyncio.get_running_loop()
+            call = partial(func, *args, **kwargs)
+            return await loop.run_in_executor(
+                self.pool, self._timed, call, time.perf_counter()
+            )
+        finally:
+            with self.lock:
+                self.inflight -= 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "max_workers": self.max_workers,
+                "calls": self.calls,
+                "errors": self.errors,
+                "slow_calls": self.slow_calls,
+                "inflight": self.inflight,
+                "max_inflight": self.max_inflight,
+                "avg_wait_ms": round(1000 * self.wait_time / self.calls, 2)
+                if self.calls
+                else 0.0,
+                "avg_run_ms": round(1000 * self.run_time / self.calls, 2)
+                if self.calls
+                else 0.0,
+            }
+
+
+# Shared I/O Pool
+io_pool = NoloIOPool()
@@ -0,0 +1,89 @@
+import time
+import threading
+from collections import OrderedDict
+import logging
+
+
+# Logger
+logger = logging.getLogger(__name__)
+
+
+class NoloLRUCache:
+    """
+    Thread safe LRU Cache with optional expiration and hit/miss counters
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_in_secs: float | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl_in_secs
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """
+        Return the cached value or default when missing or expired
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self.entries[key]
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl_in_secs: float | None = None, expires_at=None):
+        """
+        Store a value. expires_at (epoch secs) wins over ttl_in_secs, which
+        wins over the cache default ttl
+        """
+        if expires_at is None:
+            ttl = ttl_in_secs if ttl_in_secs is not None else self.ttl
+            expires_at = time.time() + ttl if ttl is not None else None
+
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def items(self) -> list:
+        """
+        Snapshot of the (key, value) pairs, oldest first
+        """
+        with self.lock:
+            return [(key, entry[0]) for key, entry in self.entries.items()]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,93 @@
+import os
+import threading
+import numpy as np
+from utils.img_hash import pixmap_to_gray
+import logging
+
+
+# Page Types
+PAGE_BLANK = "blank"
+PAGE_TEXT_ONLY = "text_only"
+PAGE_PICTURE = "picture"
+
+# Classifier Thresholds
+INK_LEVEL = 200  # gray level under which a pixel counts as ink
+BLANK_MAX_INK = float(os.getenv("PAGE_BLANK_MAX_INK", "0.005"))
+TEXT_ONLY_MAX_INK = float(os.getenv("PAGE_TEXT_ONLY_MAX_INK", "0.15"))
+TEXT_ONLY_MAX_COLOR = float(os.getenv("PAGE_TEXT_ONLY_MAX_COLOR", "12"))
+TEXT_ONLY_MAX_DRAWINGS = int(os.getenv("PAGE_TEXT_ONLY_MAX_DRAWINGS", "10"))
+
+# Logger
+logger = logging.getLogger(__name__)
+
+
+class NoloPageClassifier:
+    """
+    Cheap pre-filter to decide if a page is worth an AI description
+    """
+
+    def __init__(
+        self,
+        blank_max_ink=None,
+        text_only_max_ink=None,
+        text_only_max_color=None,
+        text_only_max_drawings=None,
+    ):
+        self.blank_max_ink = BLANK_MAX_INK if blank_max_ink is None else blank_max_ink
+        self.text_only_max_ink = (
+            TEXT_ONLY_MAX_INK if text_only_max_ink is None else text_only_max_ink
+        )
+        self.text_only_max_color = (
+            TEXT_ONLY_MAX_COLOR if text_only_max_color is None else text_only_max_color
+        )
+        self.text_only_max_drawings = (
+            TEXT_ONLY_MAX_DRAWINGS
+            if text_only_max_drawings is None
+            else text_only_max_drawings
+        )
+        self.lock = threading.Lock()
+        self.report = {PAGE_BLANK: 0, PAGE_TEXT_ONLY: 0, PAGE_PICTURE: 0}
+
+    def colorfulness(self, pixmap) -> float:
+        """
+        Hasler-Susstrunk colourfulness, close to 0 for black and white pages
+        """
+        if pixmap.n < 3:
+            return 0.0
+        samples = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(
+            pixmap.height, pixmap.width, pixmap.n
+        )
+        rgb = samples[..., :3].astype(np.float32)
+        rg = rgb[..., 0] - rgb[..., 1]
+        yb = 0.5 * (rgb[..., 0] + rgb[..., 1]) - rgb[..., 2]
+        return float(
+            np.hypot(rg.std(), yb.std()) + 0.3 * np.hypot(rg.mean(), yb.mean())
+        )
+
+    def classify(self, page, pixmap) -> str:
+        """
+        Classify a fitz.Page from its metadata and a rendered pixmap
+        """
+        ink_coverage = float((pixmap_to_gray(pixmap) < INK_LEVEL).mean())
+
+        if ink_coverage <= self.blank_max_ink:
+            page_type = PAGE_BLANK
+        elif (
+            not page.get_images()
+            and ink_coverage <= self.text_only_max_ink
+            and self.colorfulness(pixmap) <= self.text_only_max_color
+            and len(page.get_drawings()) <= self.text_only_max_drawings
+        ):
+            page_type = PAGE_TEXT_ONLY
+        else:
+            page_type = PAGE_PICTURE
+
+        with self.lock:
+            self.report[page_type] += 1
+        return page_type
+
+    def get_report(self) -> dict:
+        with self.lock:
+            report = dict(self.report)
+        report["skipped"] = report[PAGE_BLANK] + report[PAGE_TEXT_ONLY]
+        return report